@@ -0,0 +1,18 @@
+-- Полнотекстовый и нечёткий поиск по концертам
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+ALTER TABLE concerts ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', COALESCE(name, '')), 'A') ||
+        setweight(to_tsvector('simple', COALESCE(description, '')), 'B') ||
+        setweight(to_tsvector('simple', COALESCE(address, '')), 'C')
+    ) STORED;
+
+-- Ищем только среди доступных концертов, поэтому индексы частичные
+CREATE INDEX IF NOT EXISTS concerts_search_vector_idx
+    ON concerts USING GIN (search_vector)
+    WHERE available = TRUE;
+
+CREATE INDEX IF NOT EXISTS concerts_name_trgm_idx
+    ON concerts USING GIN (name gin_trgm_ops)
+    WHERE available = TRUE;
@@ -0,0 +1,141 @@
+-- Вместимость концертов и учёт проданных билетов.
+-- Остаток хранится в нескольких строках-шардах, чтобы одновременные покупки
+-- одного концерта не выстраивались в очередь за блокировкой одной строки.
+ALTER TABLE concerts ADD COLUMN IF NOT EXISTS capacity INT CHECK (capacity IS NULL OR capacity >= 0);
+
+CREATE TABLE IF NOT EXISTS concert_inventory (
+    concerts_id INT NOT NULL REFERENCES concerts(id) ON DELETE CASCADE,
+    shard SMALLINT NOT NULL,
+    capacity INT NOT NULL CHECK (capacity >= 0),
+    sold INT NOT NULL DEFAULT 0 CHECK (sold >= 0 AND sold <= capacity),
+    PRIMARY KEY (concerts_id, shard)
+);
+
+CREATE OR REPLACE VIEW concert_availability AS
+SELECT
+    concerts_id,
+    SUM(capacity) AS capacity,
+    SUM(sold) AS sold,
+    SUM(capacity - sold) AS remaining
+FROM concert_inventory
+GROUP BY concerts_id;
+
+-- Задаёт вместимость концерта и распределяет её (и уже проданные билеты) по шардам
+CREATE OR REPLACE FUNCTION set_concert_capacity(p_concert_id INT, p_capacity INT, p_shards INT DEFAULT 8)
+RETURNS VOID AS $$
+DECLARE
+    total_sold INT;
+    shard_capacity INT;
+    shard_sold INT;
+    i INT;
+BEGIN
+    IF p_capacity < 0 OR p_shards < 1 THEN
+        RAISE EXCEPTION 'Некорректная вместимость % или число шардов %', p_capacity, p_shards;
+    END IF;
+
+    PERFORM 1 FROM concerts WHERE id = p_concert_id FOR UPDATE;
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'Концерт % не найден', p_concert_id;
+    END IF;
+
+    SELECT COALESCE(SUM(sold), 0) INTO total_sold
+    FROM concert_inventory WHERE concerts_id = p_concert_id;
+
+    IF p_capacity < total_sold THEN
+        RAISE EXCEPTION 'Вместимость % меньше числа проданных билетов %', p_capacity, total_sold;
+    END IF;
+
+    DELETE FROM concert_inventory WHERE concerts_id = p_concert_id;
+
+    FOR i IN 0..p_shards - 1 LOOP
+        shard_capacity := p_capacity / p_shards + CASE WHEN i < p_capacity % p_shards THEN 1 ELSE 0 END;
+        shard_sold := LEAST(shard_capacity, total_sold);
+        total_sold := total_sold - shard_sold;
+        INSERT INTO concert_inventory (concerts_id, shard, capacity, sold)
+        VALUES (p_concert_id, i, shard_capacity, shard_sold);
+    END LOOP;
+
+    UPDATE concerts
+    SET capacity = p_capacity,
+        available = EXISTS (
+            SELECT 1 FROM concert_inventory WHERE concerts_id = p_concert_id AND sold < capacity
+        )
+    WHERE id = p_concert_id;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Снимает концерт с продажи, если во всех шардах закончились билеты.
+-- Вызывается после резервирования и повторно отдельной транзакцией после отказа
+-- TK001: два последних покупателя, завершающихся одновременно, не видят изменений
+-- друг друга, и флаг выставит следующая попытка покупки.
+CREATE OR REPLACE FUNCTION refresh_concert_availability(p_concert_id INT)
+RETURNS VOID AS $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM concert_inventory WHERE concerts_id = p_concert_id)
+       AND NOT EXISTS (
+           SELECT 1 FROM concert_inventory WHERE concerts_id = p_concert_id AND sold < capacity
+       ) THEN
+        UPDATE concerts SET available = FALSE WHERE id = p_concert_id AND available;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Атомарно резервирует билеты. Сначала берутся свободные шарды (SKIP LOCKED),
+-- занятые другими покупателями ждём только если свободных не хватило.
+-- При нехватке билетов бросает ошибку с кодом TK001, и вся транзакция откатывается.
+CREATE OR REPLACE FUNCTION reserve_tickets(p_concert_id INT, p_quantity INT)
+RETURNS VOID AS $$
+DECLARE
+    needed INT := p_quantity;
+    shard_count INT;
+    start_shard INT;
+    taken INT;
+    shard_row RECORD;
+BEGIN
+    SELECT COUNT(*) INTO shard_count FROM concert_inventory WHERE concerts_id = p_concert_id;
+    IF shard_count = 0 THEN
+        -- Вместимость не задана: количество билетов не ограничено
+        RETURN;
+    END IF;
+
+    start_shard := floor(random() * shard_count)::INT;
+
+    FOR shard_row IN
+        SELECT shard, capacity - sold AS remaining
+        FROM concert_inventory
+        WHERE concerts_id = p_concert_id AND sold < capacity
+        ORDER BY (shard - start_shard + shard_count) % shard_count
+        FOR UPDATE SKIP LOCKED
+    LOOP
+        taken := LEAST(needed, shard_row.remaining);
+        UPDATE concert_inventory SET sold = sold + taken
+        WHERE concerts_id = p_concert_id AND shard = shard_row.shard;
+        needed := needed - taken;
+        EXIT WHEN needed = 0;
+    END LOOP;
+
+    IF needed > 0 THEN
+        -- После ожидания блокировки строка перечитывается, remaining считается по актуальным данным
+        FOR shard_row IN
+            SELECT shard, capacity - sold AS remaining
+            FROM concert_inventory
+            WHERE concerts_id = p_concert_id AND sold < capacity
+            ORDER BY shard
+            FOR UPDATE
+        LOOP
+            taken := LEAST(needed, shard_row.remaining);
+            UPDATE concert_inventory SET sold = sold + taken
+            WHERE concerts_id = p_concert_id AND shard = shard_row.shard;
+            needed := needed - taken;
+            EXIT WHEN needed = 0;
+        END LOOP;
+    END IF;
+
+    IF needed > 0 THEN
+        RAISE EXCEPTION 'Недостаточно билетов на концерт %', p_concert_id
+            USING ERRCODE = 'TK001', DETAIL = p_concert_id::TEXT;
+    END IF;
+
+    PERFORM refresh_concert_availability(p_concert_id);
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,90 @@
+-- Аудит изменений на уровне операторов.
+-- Вместо строкового триггера log_event, который на каждую строку собирает
+-- текстовое представление ROW(...) и отдельно вставляет его в event_logs,
+-- триггеры на уровне оператора читают таблицы переходов и пишут все строки
+-- одним INSERT ... SELECT. Для UPDATE сохраняются только изменившиеся столбцы.
+ALTER TABLE event_logs ADD COLUMN IF NOT EXISTS table_name VARCHAR(63);
+ALTER TABLE event_logs ADD COLUMN IF NOT EXISTS changes JSONB;
+
+-- Режим аудита для каждой таблицы: off, row (прежний log_event) или statement
+CREATE TABLE IF NOT EXISTS audit_settings (
+    table_name VARCHAR(63) PRIMARY KEY,
+    mode VARCHAR(10) NOT NULL CHECK (mode IN ('off', 'row', 'statement')),
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE OR REPLACE FUNCTION log_statement_event()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO event_logs (event_type, table_name, changes)
+        SELECT TG_OP, TG_TABLE_NAME, to_jsonb(n)
+        FROM new_rows n;
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO event_logs (event_type, table_name, changes)
+        SELECT TG_OP, TG_TABLE_NAME, to_jsonb(o)
+        FROM old_rows o;
+    ELSE
+        -- Строки сопоставляются по id; сохраняется {"id": ..., "столбец": [старое, новое]}
+        INSERT INTO event_logs (event_type, table_name, changes)
+        SELECT TG_OP, TG_TABLE_NAME, jsonb_build_object('id', n.id) || diff.changed
+        FROM new_rows n
+        JOIN old_rows o ON o.id = n.id
+        CROSS JOIN LATERAL (
+            SELECT jsonb_object_agg(nv.key, jsonb_build_array(to_jsonb(o) -> nv.key, nv.value)) AS changed
+            FROM jsonb_each(to_jsonb(n)) AS nv(key, value)
+            WHERE to_jsonb(o) -> nv.key IS DISTINCT FROM nv.value
+        ) AS diff
+        WHERE diff.changed IS NOT NULL;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Переключает аудит таблицы. Триггеры пересоздаются, поэтому в режиме off
+-- запись в таблицу не несёт никаких накладных расходов.
+CREATE OR REPLACE FUNCTION set_audit_mode(p_table_name TEXT, p_mode TEXT)
+RETURNS VOID AS $$
+BEGIN
+    IF p_mode NOT IN ('off', 'row', 'statement') THEN
+        RAISE EXCEPTION 'Неизвестный режим аудита %', p_mode;
+    END IF;
+
+    EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', 'log_' || p_table_name || '_event', p_table_name);
+    EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', 'audit_' || p_table_name || '_insert', p_table_name);
+    EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', 'audit_' || p_table_name || '_update', p_table_name);
+    EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', 'audit_' || p_table_name || '_delete', p_table_name);
+
+    IF p_mode = 'row' THEN
+        EXECUTE format(
+            'CREATE TRIGGER %I AFTER INSERT OR UPDATE OR DELETE ON %I FOR EACH ROW EXECUTE FUNCTION log_event()',
+            'log_' || p_table_name || '_event', p_table_name
+        );
+    ELSIF p_mode = 'statement' THEN
+        EXECUTE format(
+            'CREATE TRIGGER %I AFTER INSERT ON %I REFERENCING NEW TABLE AS new_rows '
+            'FOR EACH STATEMENT EXECUTE FUNCTION log_statement_event()',
+            'audit_' || p_table_name || '_insert', p_table_name
+        );
+        EXECUTE format(
+            'CREATE TRIGGER %I AFTER UPDATE ON %I REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows '
+            'FOR EACH STATEMENT EXECUTE FUNCTION log_statement_event()',
+            'audit_' || p_table_name || '_update', p_table_name
+        );
+        EXECUTE format(
+            'CREATE TRIGGER %I AFTER DELETE ON %I REFERENCING OLD TABLE AS old_rows '
+            'FOR EACH STATEMENT EXECUTE FUNCTION log_statement_event()',
+            'audit_' || p_table_name || '_delete', p_table_name
+        );
+    END IF;
+
+    INSERT INTO audit_settings (table_name, mode, updated_at)
+    VALUES (p_table_name, p_mode, CURRENT_TIMESTAMP)
+    ON CONFLICT (table_name) DO UPDATE SET mode = EXCLUDED.mode, updated_at = EXCLUDED.updated_at;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Переводим на новый режим все таблицы, которые ещё не настраивались явно
+SELECT set_audit_mode(t.table_name, 'statement')
+FROM unnest(ARRAY['users', 'concerts', 'orders', 'cart', 'user_info', 'payments', 'reviews']) AS t(table_name)
+WHERE NOT EXISTS (SELECT 1 FROM audit_settings s WHERE s.table_name = t.table_name);
@@ -0,0 +1,55 @@
+-- Секционирование event_logs по created_at.
+-- Старые данные удаляются отсоединением или удалением целой секции,
+-- а не массовым DELETE. Имена секций: event_logs_pYYYYMM (по месяцам)
+-- или event_logs_pYYYYMMDD (по дням); новые секции заранее создаёт
+-- maintain_event_log_partitions() из backend/database.py.
+DO $$
+DECLARE
+    month_start DATE;
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'event_logs'::regclass) THEN
+        RETURN;
+    END IF;
+
+    ALTER TABLE event_logs RENAME TO event_logs_legacy;
+
+    CREATE TABLE event_logs (
+        id BIGINT GENERATED BY DEFAULT AS IDENTITY,
+        event_type VARCHAR(50),
+        event_description TEXT,
+        table_name VARCHAR(63),
+        changes JSONB,
+        created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (id, created_at)
+    ) PARTITION BY RANGE (created_at);
+
+    -- Страховка: строки вне созданных секций не теряются
+    CREATE TABLE event_logs_default PARTITION OF event_logs DEFAULT;
+
+    -- Секции для уже накопленных данных и на ближайшие месяцы
+    FOR month_start IN
+        SELECT DISTINCT date_trunc('month', created_at)::DATE
+        FROM event_logs_legacy
+        WHERE created_at IS NOT NULL
+        UNION
+        SELECT (date_trunc('month', CURRENT_DATE) + make_interval(months => n))::DATE
+        FROM generate_series(0, 2) AS n
+    LOOP
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF event_logs FOR VALUES FROM (%L) TO (%L)',
+            'event_logs_p' || to_char(month_start, 'YYYYMM'),
+            month_start,
+            (month_start + INTERVAL '1 month')::DATE
+        );
+    END LOOP;
+
+    INSERT INTO event_logs (event_type, event_description, table_name, changes, created_at)
+    SELECT event_type, event_description, table_name, changes, COALESCE(created_at, CURRENT_TIMESTAMP)
+    FROM event_logs_legacy
+    ORDER BY id;
+
+    DROP TABLE event_logs_legacy;
+END;
+$$;
+
+CREATE INDEX IF NOT EXISTS event_logs_created_at_idx ON event_logs (created_at);
@@ -0,0 +1,26 @@
+-- Индексы для основных путей доступа API
+
+-- /orders, /orders1, /pay_order: заказы пользователя с фильтром по статусу
+CREATE INDEX IF NOT EXISTS orders_user_status_idx ON orders (user_id, status);
+
+-- Сумма неоплаченных заказов читается только по pending-строкам
+CREATE INDEX IF NOT EXISTS orders_pending_user_idx ON orders (user_id)
+    INCLUDE (concerts_id, quantity)
+    WHERE status = 'pending';
+
+-- Корзина пользователя (GET_CART_ITEMS, CHECKOUT_CART, DELETE_FROM_CART)
+CREATE INDEX IF NOT EXISTS cart_user_idx ON cart (user_id);
+
+-- Адрес пользователя (/address/save)
+CREATE INDEX IF NOT EXISTS user_info_user_idx ON user_info (user_id);
+
+-- Последние записи на странице администратора; id добавлен для однозначного порядка
+CREATE INDEX IF NOT EXISTS reviews_created_at_idx ON reviews (created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS payments_created_at_idx ON payments (created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS user_info_created_at_idx ON user_info (created_at DESC, id DESC);
+
+-- Внешние ключи на concerts: соединения по концерту и каскадное удаление
+CREATE INDEX IF NOT EXISTS orders_concerts_idx ON orders (concerts_id);
+CREATE INDEX IF NOT EXISTS cart_concerts_idx ON cart (concerts_id);
+CREATE INDEX IF NOT EXISTS reviews_concerts_idx ON reviews (concerts_id);
+CREATE INDEX IF NOT EXISTS payments_order_idx ON payments (order_id);
@@ -0,0 +1,180 @@
+-- Сводка неоплаченных заказов по пользователям.
+-- Вместо SUM(price * quantity) и COUNT(*) по orders JOIN concerts на каждый
+-- запрос сводка хранится в user_unpaid_summary и обновляется триггерами:
+-- изменения заказов добавляются к строке пользователя как приращения,
+-- поэтому параллельные транзакции не затирают друг друга. Строка с
+-- order_count = 0 означает, что неоплаченных заказов нет.
+CREATE TABLE IF NOT EXISTS user_unpaid_summary (
+    user_id INT PRIMARY KEY,
+    total_price NUMERIC NOT NULL DEFAULT 0,
+    order_count BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Точный пересчёт сводки для перечисленных пользователей по таблице orders
+CREATE OR REPLACE FUNCTION refresh_unpaid_summary(p_user_ids INT[])
+RETURNS VOID AS $$
+BEGIN
+    INSERT INTO user_unpaid_summary (user_id, total_price, order_count, updated_at)
+    SELECT u.user_id, COALESCE(SUM(c.price * o.quantity), 0), COUNT(o.id), CURRENT_TIMESTAMP
+    FROM unnest(p_user_ids) AS u(user_id)
+    LEFT JOIN orders o ON o.user_id = u.user_id AND o.status = 'pending'
+    LEFT JOIN concerts c ON c.id = o.concerts_id
+    GROUP BY u.user_id
+    ON CONFLICT (user_id) DO UPDATE
+    SET total_price = EXCLUDED.total_price,
+        order_count = EXCLUDED.order_count,
+        updated_at = EXCLUDED.updated_at;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION maintain_unpaid_summary()
+RETURNS TRIGGER AS $$
+DECLARE
+    orphaned INT[];
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO user_unpaid_summary AS s (user_id, total_price, order_count)
+        SELECT n.user_id, SUM(c.price * n.quantity), COUNT(*)
+        FROM new_rows n
+        JOIN concerts c ON c.id = n.concerts_id
+        WHERE n.status = 'pending'
+        GROUP BY n.user_id
+        ON CONFLICT (user_id) DO UPDATE
+        SET total_price = s.total_price + EXCLUDED.total_price,
+            order_count = s.order_count + EXCLUDED.order_count,
+            updated_at = CURRENT_TIMESTAMP;
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO user_unpaid_summary AS s (user_id, total_price, order_count)
+        SELECT o.user_id, -SUM(c.price * o.quantity), -COUNT(*)
+        FROM old_rows o
+        JOIN concerts c ON c.id = o.concerts_id
+        WHERE o.status = 'pending'
+        GROUP BY o.user_id
+        ON CONFLICT (user_id) DO UPDATE
+        SET total_price = s.total_price + EXCLUDED.total_price,
+            order_count = s.order_count + EXCLUDED.order_count,
+            updated_at = CURRENT_TIMESTAMP;
+
+        -- Заказы удалены каскадно вместе с концертом: цену взять неоткуда,
+        -- сводку таких пользователей пересчитываем целиком
+        SELECT array_agg(DISTINCT o.user_id) INTO orphaned
+        FROM old_rows o
+        WHERE o.status = 'pending'
+          AND NOT EXISTS (SELECT 1 FROM concerts c WHERE c.id = o.concerts_id);
+        IF orphaned IS NOT NULL THEN
+            PERFORM refresh_unpaid_summary(orphaned);
+        END IF;
+    ELSE
+        -- Оплата, отмена или правка заказа: -старое значение +новое
+        INSERT INTO user_unpaid_summary AS s (user_id, total_price, order_count)
+        SELECT d.user_id, SUM(d.amount), SUM(d.orders)
+        FROM (
+            SELECT n.user_id, c.price * n.quantity AS amount, 1 AS orders
+            FROM new_rows n
+            JOIN concerts c ON c.id = n.concerts_id
+            WHERE n.status = 'pending'
+            UNION ALL
+            SELECT o.user_id, -(c.price * o.quantity), -1
+            FROM old_rows o
+            JOIN concerts c ON c.id = o.concerts_id
+            WHERE o.status = 'pending'
+        ) AS d
+        GROUP BY d.user_id
+        HAVING SUM(d.orders) <> 0 OR SUM(d.amount) <> 0
+        ON CONFLICT (user_id) DO UPDATE
+        SET total_price = s.total_price + EXCLUDED.total_price,
+            order_count = s.order_count + EXCLUDED.order_count,
+            updated_at = CURRENT_TIMESTAMP;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS unpaid_summary_insert ON orders;
+DROP TRIGGER IF EXISTS unpaid_summary_update ON orders;
+DROP TRIGGER IF EXISTS unpaid_summary_delete ON orders;
+CREATE TRIGGER unpaid_summary_insert AFTER INSERT ON orders
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION maintain_unpaid_summary();
+CREATE TRIGGER unpaid_summary_update AFTER UPDATE ON orders
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION maintain_unpaid_summary();
+CREATE TRIGGER unpaid_summary_delete AFTER DELETE ON orders
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION maintain_unpaid_summary();
+
+-- Сумма считается по текущей цене концерта, поэтому смена цены
+-- пересчитывает сводку пользователей с неоплаченными заказами на этот концерт
+CREATE OR REPLACE FUNCTION refresh_unpaid_summary_on_price()
+RETURNS TRIGGER AS $$
+DECLARE
+    affected INT[];
+BEGIN
+    SELECT array_agg(DISTINCT o.user_id) INTO affected
+    FROM new_rows n
+    JOIN old_rows p ON p.id = n.id AND p.price IS DISTINCT FROM n.price
+    JOIN orders o ON o.concerts_id = n.id AND o.status = 'pending';
+    IF affected IS NOT NULL THEN
+        PERFORM refresh_unpaid_summary(affected);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS unpaid_summary_price ON concerts;
+CREATE TRIGGER unpaid_summary_price AFTER UPDATE ON concerts
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION refresh_unpaid_summary_on_price();
+
+-- Расхождения между сводкой и пересчётом по orders
+CREATE OR REPLACE FUNCTION check_unpaid_summary()
+RETURNS TABLE (user_id INT, stored_total NUMERIC, actual_total NUMERIC, stored_count BIGINT, actual_count BIGINT) AS $$
+    WITH actual AS (
+        SELECT o.user_id, SUM(c.price * o.quantity) AS total_price, COUNT(*) AS order_count
+        FROM orders o
+        JOIN concerts c ON c.id = o.concerts_id
+        WHERE o.status = 'pending'
+        GROUP BY o.user_id
+    ),
+    stored AS (
+        SELECT s.user_id, s.total_price, s.order_count
+        FROM user_unpaid_summary s
+        WHERE s.order_count <> 0 OR s.total_price <> 0
+    )
+    SELECT COALESCE(s.user_id, a.user_id), s.total_price, a.total_price, s.order_count, a.order_count
+    FROM stored s
+    FULL JOIN actual a ON a.user_id = s.user_id
+    WHERE s.total_price IS DISTINCT FROM a.total_price
+       OR s.order_count IS DISTINCT FROM a.order_count;
+$$ LANGUAGE sql STABLE;
+
+-- Полная перестройка сводки. Блокировка SHARE не даёт менять заказы,
+-- пока таблица строится заново; чтение заказов при этом не блокируется
+CREATE OR REPLACE FUNCTION rebuild_unpaid_summary()
+RETURNS BIGINT AS $$
+DECLARE
+    rebuilt BIGINT;
+BEGIN
+    LOCK TABLE orders IN SHARE MODE;
+    DELETE FROM user_unpaid_summary;
+    INSERT INTO user_unpaid_summary (user_id, total_price, order_count)
+    SELECT o.user_id, SUM(c.price * o.quantity), COUNT(*)
+    FROM orders o
+    JOIN concerts c ON c.id = o.concerts_id
+    WHERE o.status = 'pending'
+    GROUP BY o.user_id;
+    GET DIAGNOSTICS rebuilt = ROW_COUNT;
+    RETURN rebuilt;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Первоначальное заполнение по уже существующим заказам
+SELECT rebuild_unpaid_summary()
+WHERE NOT EXISTS (SELECT 1 FROM user_unpaid_summary);
+
+-- Представление сохраняет прежние столбцы, но читает готовую сводку
+CREATE OR REPLACE VIEW unpaid_orders_summary AS
+SELECT user_id, total_price, order_count
+FROM user_unpaid_summary
+WHERE order_count > 0;
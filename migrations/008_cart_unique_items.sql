@@ -0,0 +1,29 @@
+-- Одна строка корзины на пару (пользователь, концерт): повторное добавление
+-- концерта увеличивает количество через INSERT ... ON CONFLICT DO UPDATE
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'cart_user_concert_key') THEN
+        RETURN;
+    END IF;
+
+    -- Сливаем накопившиеся дубликаты: остаётся самая ранняя строка с суммарным количеством
+    CREATE TEMP TABLE cart_duplicates ON COMMIT DROP AS
+    SELECT MIN(id) AS keep_id, user_id, concerts_id, SUM(quantity) AS quantity
+    FROM cart
+    GROUP BY user_id, concerts_id
+    HAVING COUNT(*) > 1;
+
+    UPDATE cart c SET quantity = d.quantity
+    FROM cart_duplicates d
+    WHERE c.id = d.keep_id;
+
+    DELETE FROM cart c
+    USING cart_duplicates d
+    WHERE c.user_id = d.user_id AND c.concerts_id = d.concerts_id AND c.id <> d.keep_id;
+
+    ALTER TABLE cart ADD CONSTRAINT cart_user_concert_key UNIQUE (user_id, concerts_id);
+END;
+$$;
+
+-- Уникальный индекс начинается с user_id и заменяет cart_user_idx
+DROP INDEX IF EXISTS cart_user_idx;
@@ -0,0 +1,50 @@
+-- Версия корзины каждого пользователя для ETag в GET /cart/{username}.
+-- Любое изменение cart (в том числе каскадное удаление вместе с концертом
+-- или оформление заказа) увеличивает версию затронутых пользователей, поэтому
+-- проверка If-None-Match стоит одного чтения по первичному ключу.
+CREATE TABLE IF NOT EXISTS cart_versions (
+    user_id INT PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 1
+);
+
+CREATE OR REPLACE FUNCTION bump_cart_versions()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'TRUNCATE' THEN
+        UPDATE cart_versions SET version = version + 1;
+        RETURN NULL;
+    END IF;
+
+    -- Порядок по user_id: параллельные операторы блокируют строки в одном порядке
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO cart_versions AS v (user_id)
+        SELECT DISTINCT user_id FROM new_rows ORDER BY user_id
+        ON CONFLICT (user_id) DO UPDATE SET version = v.version + 1;
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO cart_versions AS v (user_id)
+        SELECT DISTINCT user_id FROM old_rows ORDER BY user_id
+        ON CONFLICT (user_id) DO UPDATE SET version = v.version + 1;
+    ELSE
+        INSERT INTO cart_versions AS v (user_id)
+        SELECT user_id FROM new_rows UNION SELECT user_id FROM old_rows ORDER BY user_id
+        ON CONFLICT (user_id) DO UPDATE SET version = v.version + 1;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS cart_versions_insert ON cart;
+DROP TRIGGER IF EXISTS cart_versions_update ON cart;
+DROP TRIGGER IF EXISTS cart_versions_delete ON cart;
+DROP TRIGGER IF EXISTS cart_versions_truncate ON cart;
+CREATE TRIGGER cart_versions_insert AFTER INSERT ON cart
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION bump_cart_versions();
+CREATE TRIGGER cart_versions_update AFTER UPDATE ON cart
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION bump_cart_versions();
+CREATE TRIGGER cart_versions_delete AFTER DELETE ON cart
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION bump_cart_versions();
+CREATE TRIGGER cart_versions_truncate AFTER TRUNCATE ON cart
+FOR EACH STATEMENT EXECUTE FUNCTION bump_cart_versions();
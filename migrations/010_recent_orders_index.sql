@@ -0,0 +1,2 @@
+-- /me/overview: последние заказы пользователя читаются по индексу в нужном порядке
+CREATE INDEX IF NOT EXISTS orders_user_created_at_idx ON orders (user_id, created_at DESC, id DESC);
@@ -0,0 +1,13 @@
+-- Уведомление API об изменении каталога (сброс кэша GET /concerts)
+CREATE OR REPLACE FUNCTION notify_concerts_changed()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('concerts_changed', TG_OP);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS notify_concerts_changed ON concerts;
+CREATE TRIGGER notify_concerts_changed
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON concerts
+FOR EACH STATEMENT EXECUTE FUNCTION notify_concerts_changed();
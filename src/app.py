@@ -1,22 +1,70 @@
-from fastapi import FastAPI, Depends, HTTPException, Body, Query, UploadFile
-from pydantic import BaseModel
-from backend.database import get_connection
-from backend.auth import hash_password, verify_password, create_access_token
-from backend.queries import CREATE_USER, CREATE_CONCERT, GET_USER_BY_USERNAME, GET_CONCERTS, ADD_TO_CART, GET_CART_ITEMS, DELETE_FROM_CART, GET_ORDERS
+from fastapi import FastAPI, Depends, HTTPException, Body, Query, UploadFile, Header
+from pydantic import BaseModel, Field, TypeAdapter
+from backend.database import connection, async_connection, get_db, get_async_db, pool_stats, async_pool_stats, close_pool, open_async_pool, close_async_pool, run_partition_maintenance, maintain_event_log_partitions, check_unpaid_summary, PoolTimeout
+from backend.cache import (
+    concerts_cache, concert_ids, listen_for_invalidations, make_etag, etag_matches,
+    CATALOG_CACHE_CONTROL, CART_CACHE_CONTROL,
+)
+from backend.export import stream_export, MEDIA_TYPES
+from backend.concert_import import import_concerts
+from backend.backup import start_backup, start_restore, get_job, list_jobs, cancel_jobs, stream_backup, JobConflict
+from backend.metrics import MetricsMiddleware, set_pool_stats, render as render_metrics, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from backend.auth import hash_password_async, verify_password_async, create_access_token, get_current_user, hasher_pool, AuthPoolSaturated
+from backend.queries import (
+    CREATE_USER, CREATE_CONCERT, GET_USER_BY_USERNAME, GET_CONCERTS, ADD_TO_CART, GET_CART_VERSION,
+    GET_CART_ITEMS, DELETE_FROM_CART, UPDATE_CART, SEARCH_CONCERTS, CHECKOUT_CART, SET_CONCERT_CAPACITY,
+    GET_CONCERT_AVAILABILITY, REFRESH_CONCERT_AVAILABILITY, TICKETS_SOLD_OUT, AUDITED_TABLES,
+    GET_AUDIT_SETTINGS, SET_AUDIT_MODE, GET_CONCERT_ID_BY_NAME, CREATE_REVIEW,
+    GET_USER_INFO_FOR_UPDATE, UPDATE_USER_INFO, CREATE_USER_INFO, GET_PAYMENTS, GET_ALL_REVIEWS,
+    GET_ALL_ADDRESSES, GET_UNPAID_SUMMARY, GET_USER_ORDERS, GET_UNPAID_TOTAL, PAY_ORDERS,
+    CREATE_PAYMENT, GET_RECENT_USER_ORDERS, BEGIN_SNAPSHOT,
+)
 import psycopg2
-from psycopg2.extras import DictCursor
+from psycopg2.errorcodes import DEADLOCK_DETECTED
 import logging
 from typing import List
-from typing import Optional
-from fastapi.responses import FileResponse
+from typing import Optional, Literal
 import os
+import asyncio
+import base64
+import itertools
+import json
 from datetime import datetime
+from contextlib import asynccontextmanager
 
-from fastapi.security import OAuth2PasswordBearer
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
-app = FastAPI()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await open_async_pool()
+    listener = asyncio.create_task(listen_for_invalidations())
+    partition_maintenance = asyncio.create_task(run_partition_maintenance())
+    yield
+    partition_maintenance.cancel()
+    cancel_jobs()
+    listener.cancel()
+    await close_async_pool()
+    close_pool()
+    hasher_pool.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
+
+
+@app.exception_handler(PoolTimeout)
+async def pool_timeout_handler(request, exc: PoolTimeout):
+    return JSONResponse(status_code=503, content={"detail": f"База данных перегружена: {str(exc)}"})
+
+
+@app.exception_handler(AuthPoolSaturated)
+async def auth_pool_saturated_handler(request, exc: AuthPoolSaturated):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"})
+
+
+# Число строк-шардов остатка билетов на концерт по умолчанию
+INVENTORY_SHARDS = int(os.getenv("INVENTORY_SHARDS", "8"))
 
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -27,6 +75,14 @@ class NewConcertRequest(BaseModel):
     address: str
     price: float
     date: str
+    capacity: Optional[int] = Field(None, ge=0)
+
+class CapacityRequest(BaseModel):
+    capacity: int = Field(..., ge=0)
+    shards: int = Field(INVENTORY_SHARDS, ge=1, le=64)
+
+class AuditModeRequest(BaseModel):
+    mode: Literal["off", "row", "statement"]
 
 class RegisterRequest(BaseModel):
     username: str
@@ -38,6 +94,7 @@ class LoginRequest(BaseModel):
     password: str
 
 class concertsItem(BaseModel):
+    id: int
     name: str
     description: str
     address: str
@@ -45,19 +102,33 @@ class concertsItem(BaseModel):
     date: datetime
     image_url: str
 
+concerts_adapter = TypeAdapter(list[concertsItem])
+
 class CartAddItem(BaseModel):
-    username: str
-    item_name: str
-    quantity: int
+    username: Optional[str] = None
+    concert_id: Optional[int] = None
+    # Имя концерта оставлено для совместимости со старыми клиентами
+    item_name: Optional[str] = None
+    quantity: int = Field(..., gt=0)
+
+class CartChange(BaseModel):
+    concert_id: int
+    # 0 удаляет концерт из корзины
+    quantity: int = Field(..., ge=0)
+
+class CartUpdateRequest(BaseModel):
+    username: Optional[str] = None
+    items: List[CartChange] = Field(..., min_length=1, max_length=100)
 
 class CartItem(BaseModel):
+    concert_id: int
     item_name: str
     quantity: int
     price: float
     created_at: str
 
 class ReviewRequest(BaseModel):
-    username: str
+    username: Optional[str] = None
     item_name: str
     rating: int
     review: str 
@@ -90,475 +161,734 @@ class OrderRequest(BaseModel):
     surname: str
 
 class AddressRequest(BaseModel):
-    username: str
+    username: Optional[str] = None
     address: str
     name: str
     surname: str
 
 
-@app.post("/admin/backup")
-def create_backup():
-    try:
-        backup_file = "db_backup.sql"
-        os.system(f"pg_dump -U ks -h localhost -p 8001 food > {backup_file}")
-        
-        return FileResponse(
-            path=backup_file,
-            filename=backup_file,
-            media_type="application/sql"
-        )
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Ошибка при создании бэкапа: {str(e)}")
+def ensure_same_user(current_user: dict, username: Optional[str]):
+    # username в пути или теле оставлен для совместимости и должен совпадать с владельцем токена
+    if username is not None and username != current_user["username"]:
+        raise HTTPException(status_code=403, detail="Нет доступа к данным другого пользователя")
 
-@app.post("/admin/restore")
-async def restore_backup(file: UploadFile):
-    try:
-        backup_file = "/tmp/restore_backup.sql"
-        with open(backup_file, "wb") as f:
-            content = await file.read()
-            f.write(content)
 
-        os.system(f" psql -U myuser -h localhost -p 5432 postgres < backup_file")
-        
-        return {"status": "success", "message": "База данных успешно восстановлена из бэкапа"}
+async def require_admin(current_user: dict = Depends(get_current_user)) -> dict:
+    """FastAPI-зависимость для маршрутов, отдающих данные целиком (выгрузки, резервные копии)."""
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Требуются права администратора")
+    return current_user
+
+
+def get_backup_job(job_id: str):
+    job = get_job(job_id)
+    if not job or job["kind"] != "backup":
+        raise HTTPException(status_code=404, detail="Задача резервного копирования не найдена")
+    return job
+
+@app.post("/admin/backup", status_code=202)
+async def create_backup(current_user: dict = Depends(require_admin)):
+    # start_backup запускает задачу в цикле событий, поэтому маршрут асинхронный
+    try:
+        return start_backup()
+    except JobConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@app.get("/admin/backup")
+def get_backups(current_user: dict = Depends(require_admin)):
+    return list_jobs("backup")
+
+@app.get("/admin/backup/{job_id}")
+def get_backup_status(job_id: str, current_user: dict = Depends(require_admin)):
+    return get_backup_job(job_id)
+
+@app.get("/admin/backup/{job_id}/download")
+def download_backup(job_id: str, current_user: dict = Depends(require_admin)):
+    job = get_backup_job(job_id)
+    if job["status"] != "done":
+        raise HTTPException(status_code=409, detail=f"Резервная копия не готова: {job['status']}")
+    filename = os.path.basename(job["path"]) + ".tar"
+    return StreamingResponse(
+        stream_backup(job_id),
+        media_type="application/x-tar",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+@app.post("/admin/restore", status_code=202)
+async def restore_backup(file: UploadFile, current_user: dict = Depends(require_admin)):
+    try:
+        return await start_restore(file.file)
+    except JobConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ошибка при восстановлении базы данных: {str(e)}")
 
+@app.get("/admin/restore/{job_id}")
+def get_restore_status(job_id: str, current_user: dict = Depends(require_admin)):
+    job = get_job(job_id)
+    if not job or job["kind"] != "restore":
+        raise HTTPException(status_code=404, detail="Задача восстановления не найдена")
+    return job
+
 @app.post("/reviews/add")
-async def add_review(review: ReviewRequest):
-    conn = get_connection()
+async def add_review(review: ReviewRequest, current_user: dict = Depends(get_current_user), conn=Depends(get_async_db)):
+    ensure_same_user(current_user, review.username)
     try:
         cursor = conn.cursor()
+        user_id = current_user['id']
 
-        cursor.execute("SELECT id FROM users WHERE username = %s", (review.username,))
-        user = cursor.fetchone()
-
-        if not user:
-            raise HTTPException(status_code=404, detail="Пользователь не найден")
-        
-        user_id = user['id']
-
-        cursor.execute("SELECT id FROM concerts WHERE name = %s", (review.item_name,))
+        await cursor.execute(GET_CONCERT_ID_BY_NAME, (review.item_name,))
         item = cursor.fetchone()
         
         concerts_id = item['id']
-        cursor.execute(
-            """
-            INSERT INTO reviews (user_id, concerts_id, rating, review)
-            VALUES (%s, %s, %s, %s)
-            """,
+        await cursor.execute(
+            CREATE_REVIEW,
             (user_id, concerts_id, review.rating, review.review),
         )
-        conn.commit()
 
         logging.info("Отзыв успешно добавлен в базу данных")
         return {"status": "success", "message": "Отзыв добавлен"}
     
     except Exception as e:
-        conn.rollback()
         logging.error(f"Ошибка при добавлении отзыва: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Ошибка при добавлении отзыва: {str(e)}")
-    finally:
-        conn.close()
-        logging.info("Соединение с базой данных закрыто")
 
 @app.post("/address/save")
-async def save_address(address_request: AddressRequest):
-    conn = get_connection()
+async def save_address(address_request: AddressRequest, current_user: dict = Depends(get_current_user), conn=Depends(get_async_db)):
+    ensure_same_user(current_user, address_request.username)
     try:
-        cursor = conn.cursor()
+        async with conn.transaction():
+            cursor = conn.cursor()
+            user_id = current_user['id']
+            
+            await cursor.execute(GET_USER_INFO_FOR_UPDATE, (user_id,))
+            address = cursor.fetchone()
+            logging.info(address)
+
+            if address:
+                await cursor.execute(UPDATE_USER_INFO, (address_request.address, address_request.name, address_request.surname, user_id))
+            else:
+                await cursor.execute(CREATE_USER_INFO, (user_id, address_request.address, address_request.name, address_request.surname))
 
-        cursor.execute("SELECT id FROM users WHERE username = %s", (address_request.username,))
-        user = cursor.fetchone()
-        logging.info(user)
-        if not user:
-            raise HTTPException(status_code=404, detail="Пользователь не найден")
-        user_id = user['id']
-        
-        cursor.execute("SELECT id FROM user_info WHERE user_id = %s", (user_id,))
-        address = cursor.fetchone()
-        logging.info(address)
-
-        if address:
-            cursor.execute("""
-                UPDATE user_info
-                SET address = %s, name = %s, surname = %s, created_at = CURRENT_TIMESTAMP
-                WHERE user_id = %s
-            """, (address_request.address, address_request.name, address_request.surname, user_id))
-        else:
-            cursor.execute("""
-                INSERT INTO user_info (user_id, address, name, surname, created_at)
-                VALUES (%s, %s, %s, %s, CURRENT_TIMESTAMP)
-            """, (user_id, address_request.address, address_request.name, address_request.surname))
-
-        conn.commit()
         return {"status": "success", "message": "Адрес сохранён"}
 
     except Exception as e:
-        conn.rollback()
         logging.error(f"Ошибка при сохранении адреса: {str(e)}")
         raise HTTPException(status_code=500, detail="Ошибка при сохранении адреса")
-    
-    finally:
-        conn.close()
+
+
+def encode_cursor(row):
+    raw = json.dumps([row["created_at"].isoformat(), row["id"]]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+def decode_cursor(cursor: Optional[str]):
+    if cursor is None:
+        return "infinity", 2147483647
+    try:
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(created_at), int(row_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Некорректный курсор страницы")
+
+class PageParams:
+    def __init__(
+        self,
+        limit: int = Query(10, ge=1, le=100, description="Размер страницы"),
+        cursor: Optional[str] = Query(None, description="Курсор следующей страницы"),
+        date_from: Optional[datetime] = Query(None, description="Начало периода (включительно)"),
+        date_to: Optional[datetime] = Query(None, description="Конец периода (не включительно)"),
+    ):
+        self.limit = limit
+        self.cursor = cursor
+        self.date_from = date_from
+        self.date_to = date_to
+
+    def query_params(self):
+        before_created_at, before_id = decode_cursor(self.cursor)
+        return {
+            "before_created_at": before_created_at,
+            "before_id": before_id,
+            "date_from": self.date_from or "-infinity",
+            "date_to": self.date_to or "infinity",
+            # Лишняя строка показывает, есть ли следующая страница
+            "limit": self.limit + 1,
+        }
+
+def page_result(rows, page: PageParams):
+    next_cursor = encode_cursor(rows[page.limit - 1]) if len(rows) > page.limit else None
+    return {"items": rows[:page.limit], "next_cursor": next_cursor}
+
+def fetch_page(conn, query, page: PageParams):
+    with conn.cursor() as cursor:
+        cursor.execute(query, page.query_params())
+        rows = [dict(row) for row in cursor.fetchall()]
+    return page_result(rows, page)
+
+async def fetch_page_async(query, page: PageParams):
+    """fetch_page на собственном соединении асинхронного пула."""
+    params = page.query_params()
+    async with async_connection() as conn:
+        with conn.cursor() as cursor:
+            await cursor.execute(query, params)
+            rows = [dict(row) for row in cursor.fetchall()]
+    return page_result(rows, page)
 
 
 @app.get("/admin/payments")
-def get_payments():
-    conn = get_connection()
+def get_payments(page: PageParams = Depends(), conn=Depends(get_db)):
     try:
-        with conn.cursor(cursor_factory=DictCursor) as cursor:
-            cursor.execute("""
-                SELECT order_id, payment_method, amount, status, created_at
-                FROM payments
-                ORDER BY created_at DESC
-                LIMIT 10
-            """)
-            payments = cursor.fetchall()
-            return [dict(payment) for payment in payments]
+        return fetch_page(conn, GET_PAYMENTS, page)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ошибка при получении платежей: {str(e)}")
-    finally:
-        conn.close()
 
 @app.get("/admin/reviews")
-def get_all_reviews():
-    conn = get_connection()
+def get_all_reviews(page: PageParams = Depends(), conn=Depends(get_db)):
     try:
-        with conn.cursor(cursor_factory=DictCursor) as cursor:
-            cursor.execute("""
-                SELECT id, user_id, concerts_id, rating, review, created_at 
-                FROM reviews 
-                ORDER BY created_at DESC
-                LIMIT 10
-            """)
-            reviews = cursor.fetchall()
-            return [dict(review) for review in reviews]
+        return fetch_page(conn, GET_ALL_REVIEWS, page)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ошибка при получении отзывов: {str(e)}")
-    finally:
-        conn.close()
 
 @app.get("/admin/addresses")
-def get_all_addresses():
-    conn = get_connection()
+def get_all_addresses(page: PageParams = Depends(), conn=Depends(get_db)):
     try:
-        with conn.cursor(cursor_factory=DictCursor) as cursor:
-            cursor.execute("""
-                SELECT id, user_id, address, name, surname, created_at 
-                FROM user_info 
-                ORDER BY created_at DESC
-                LIMIT 10
-            """)
-            addresses = cursor.fetchall()
-            return [dict(address) for address in addresses]
+        return fetch_page(conn, GET_ALL_ADDRESSES, page)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ошибка при получении адресов: {str(e)}")
-    finally:
-        conn.close()
+
+ADMIN_OVERVIEW_SECTIONS = {
+    "reviews": GET_ALL_REVIEWS,
+    "addresses": GET_ALL_ADDRESSES,
+    "payments": GET_PAYMENTS,
+}
+
+@app.get("/admin/overview")
+async def get_admin_overview(
+    limit: int = Query(10, ge=1, le=100, description="Размер страницы каждого раздела"),
+    date_from: Optional[datetime] = Query(None, description="Начало периода (включительно)"),
+    date_to: Optional[datetime] = Query(None, description="Конец периода (не включительно)"),
+    reviews_cursor: Optional[str] = Query(None, description="Курсор следующей страницы отзывов"),
+    addresses_cursor: Optional[str] = Query(None, description="Курсор следующей страницы адресов"),
+    payments_cursor: Optional[str] = Query(None, description="Курсор следующей страницы платежей"),
+    current_user: dict = Depends(require_admin),
+):
+    """Отзывы, адреса и платежи для страницы администратора одним ответом. Запросы
+    выполняются одновременно на трёх соединениях асинхронного пула, поэтому ответ
+    приходит за время самого медленного из них. Фильтры общие, курсоры у разделов свои."""
+    cursors = {"reviews": reviews_cursor, "addresses": addresses_cursor, "payments": payments_cursor}
+    pages = {
+        name: PageParams(limit=limit, cursor=cursors[name], date_from=date_from, date_to=date_to)
+        for name in ADMIN_OVERVIEW_SECTIONS
+    }
+    try:
+        results = await asyncio.gather(*(
+            fetch_page_async(query, pages[name]) for name, query in ADMIN_OVERVIEW_SECTIONS.items()
+        ))
+        return dict(zip(ADMIN_OVERVIEW_SECTIONS, results))
+    except (HTTPException, PoolTimeout):
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка при получении данных администратора: {str(e)}")
+
+@app.get("/admin/export/{table}")
+def export_table(
+    table: Literal["orders", "payments", "reviews"],
+    format: Literal["csv", "ndjson", "arrow", "parquet"] = Query("csv", description="Формат выгрузки"),
+    current_user: dict = Depends(require_admin),
+):
+    chunks = stream_export(table, format)
+    # Соединение берётся из пула до отправки заголовков, чтобы перегрузка вернулась как 503
+    first_chunk = next(chunks)
+    return StreamingResponse(
+        itertools.chain([first_chunk], chunks),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{table}.{format}"'},
+    )
+
+@app.get("/admin/db/pool")
+def get_pool_stats():
+    return {"sync": pool_stats(), "async": async_pool_stats()}
+
+@app.get("/admin/auth/pool")
+def get_auth_pool_stats():
+    return hasher_pool.stats()
+
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    # Текстовый формат Prometheus; состояние пулов снимается в момент запроса
+    set_pool_stats({"sync": pool_stats(), "async": async_pool_stats()}, hasher_pool.stats())
+    return Response(content=render_metrics(), media_type=METRICS_CONTENT_TYPE)
+
+@app.get("/admin/audit")
+def get_audit_settings(conn=Depends(get_db)):
+    cursor = conn.cursor()
+    cursor.execute(GET_AUDIT_SETTINGS)
+    return cursor.fetchall()
+
+@app.put("/admin/audit/{table_name}")
+def set_audit_mode(
+    table_name: str, request: AuditModeRequest, current_user: dict = Depends(require_admin), conn=Depends(get_db)
+):
+    if table_name not in AUDITED_TABLES:
+        raise HTTPException(status_code=404, detail="Аудит для этой таблицы не поддерживается")
+    try:
+        cursor = conn.cursor()
+        cursor.execute(SET_AUDIT_MODE, (table_name, request.mode))
+        conn.commit()
+        return {"status": "success", "message": f"Режим аудита {table_name}: {request.mode}"}
+    except Exception as e:
+        conn.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/admin/event_logs/maintain")
+def maintain_event_logs(current_user: dict = Depends(require_admin)):
+    return maintain_event_log_partitions()
+
+@app.get("/admin/orders/summary/check")
+def check_orders_summary():
+    return check_unpaid_summary()
+
+@app.post("/admin/orders/summary/rebuild")
+def rebuild_orders_summary(current_user: dict = Depends(require_admin)):
+    return check_unpaid_summary(rebuild=True)
+
+@app.get("/admin/cache")
+def get_cache_stats():
+    return {"concerts": concerts_cache.stats(), "concert_ids": concert_ids.stats()}
 
 @app.get("/")
 def read_root():
     return {"message": "Hello World"}
 
 @app.post("/register")
-def register(request: RegisterRequest):
-    conn = get_connection()
+async def register(request: RegisterRequest):
     try:
-        cursor = conn.cursor()
-        hashed_password = hash_password(request.password)
-        cursor.execute(CREATE_USER, (request.username, hashed_password, request.role))
-        conn.commit()
+        # Хеширование идёт до получения соединения: ожидание пула хеширования
+        # не должно занимать соединения, нужные другим маршрутам
+        hashed_password = await hash_password_async(request.password)
+        async with async_connection() as conn:
+            with conn.cursor() as cursor:
+                await cursor.execute(CREATE_USER, (request.username, hashed_password, request.role))
         return {"status": "success", "message": "User registered successfully"}
+    except (AuthPoolSaturated, PoolTimeout):
+        raise
     except Exception as e:
-        conn.rollback()
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        conn.close()
 
 @app.post("/new_concert")
-def add_new_concert(request: NewConcertRequest):
-    conn = get_connection()
+def add_new_concert(request: NewConcertRequest, conn=Depends(get_db)):
     try:
         cursor = conn.cursor()
         cursor.execute(CREATE_CONCERT, (request.name, request.description, request.address, request.price, request.date))
+        concert_id = cursor.fetchone()["id"]
+        if request.capacity is not None:
+            cursor.execute(SET_CONCERT_CAPACITY, (concert_id, request.capacity, INVENTORY_SHARDS))
         conn.commit()
+        concerts_cache.invalidate()
         return {"status": "success", "message": "Concert added successfully"}
     except Exception as e:
         conn.rollback()
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        conn.close()
 
-@app.post("/login")
-def login(request: LoginRequest):
-    conn = get_connection()
+@app.post("/admin/concerts/import")
+def import_concerts_file(
+    file: UploadFile,
+    format: Literal["csv", "ndjson"] = Query("csv", description="Формат файла"),
+    overwrite: bool = Query(True, description="Обновлять концерты с совпадающим названием"),
+    current_user: dict = Depends(require_admin),
+    conn=Depends(get_db),
+):
+    try:
+        report = import_concerts(conn, file.file, format, overwrite, INVENTORY_SHARDS)
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        raise HTTPException(status_code=400, detail=f"Ошибка импорта концертов: {str(e)}")
+    concerts_cache.invalidate()
+    return report
+
+@app.put("/admin/concerts/{concert_id}/capacity")
+def set_concert_capacity(
+    concert_id: int, request: CapacityRequest, current_user: dict = Depends(require_admin), conn=Depends(get_db)
+):
     try:
         cursor = conn.cursor()
-        cursor.execute(GET_USER_BY_USERNAME, (request.username,))
-        user = cursor.fetchone()
-        if not user or not verify_password(request.password, user["password_hash"]):
+        cursor.execute(SET_CONCERT_CAPACITY, (concert_id, request.capacity, request.shards))
+        conn.commit()
+        concerts_cache.invalidate()
+        return {"status": "success", "message": "Вместимость концерта обновлена"}
+    except Exception as e:
+        conn.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/concerts/{concert_id}/availability")
+def get_concert_availability(concert_id: int, conn=Depends(get_db)):
+    cursor = conn.cursor()
+    cursor.execute(GET_CONCERT_AVAILABILITY, (concert_id,))
+    availability = cursor.fetchone()
+    if not availability:
+        raise HTTPException(status_code=404, detail="Концерт не найден")
+    return availability
+
+@app.post("/login")
+async def login(request: LoginRequest):
+    try:
+        # Соединение возвращается в пул до проверки пароля
+        async with async_connection() as conn:
+            with conn.cursor() as cursor:
+                await cursor.execute(GET_USER_BY_USERNAME, (request.username,))
+                user = cursor.fetchone()
+        if not user or not await verify_password_async(request.password, user["password_hash"]):
             raise HTTPException(status_code=401, detail="Invalid username or password")
-        token = create_access_token({"username": request.username, "role": user["role"]})
+        token = create_access_token({"user_id": user["id"], "username": user["username"], "role": user["role"]})
         return {"access_token": token, "role": user["role"]}
+    except (HTTPException, AuthPoolSaturated, PoolTimeout):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        conn.close()
+
+def not_modified(etag, cache_control):
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control})
 
 @app.get("/concerts", response_model=list[concertsItem])
-def get_concerts():
-    conn = get_connection()
+def get_concerts(if_none_match: Optional[str] = Header(None)):
+    # Поколение читается до запроса: ETag никогда не окажется новее данных
+    generation = concerts_cache.generation()
+    etag = make_etag("concerts", generation)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag, CATALOG_CACHE_CONTROL)
+    headers = {"ETag": etag, "Cache-Control": CATALOG_CACHE_CONTROL}
+    body = concerts_cache.get()
+    if body is not None:
+        return Response(content=body, media_type="application/json", headers=headers)
     try:
-        cursor = conn.cursor()
-        cursor.execute(GET_CONCERTS)
-        concerts_items = cursor.fetchall()
-        return concerts_items
+        with connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(GET_CONCERTS)
+            concerts_items = cursor.fetchall()
+        body = concerts_adapter.dump_json(concerts_adapter.validate_python(concerts_items))
+        concerts_cache.set(body, generation)
+        return Response(content=body, media_type="application/json", headers=headers)
+    except PoolTimeout:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        conn.close()
+
+def resolve_concert_id(conn, concert_id: Optional[int], item_name: Optional[str]):
+    if concert_id is not None:
+        return concert_id
+    if not item_name:
+        raise HTTPException(status_code=422, detail="Укажите concert_id или item_name")
+
+    def load(name):
+        with conn.cursor() as cursor:
+            cursor.execute(GET_CONCERT_ID_BY_NAME, (name,))
+            row = cursor.fetchone()
+        return row["id"] if row else None
+
+    resolved = concert_ids.resolve(item_name, load)
+    if resolved is None:
+        raise HTTPException(status_code=404, detail="Концерт не найден")
+    return resolved
 
 @app.post("/cart/add")
-def add_to_cart(cart_item: CartAddItem):
-    conn = get_connection()
+def add_to_cart(cart_item: CartAddItem, current_user: dict = Depends(get_current_user), conn=Depends(get_db)):
+    ensure_same_user(current_user, cart_item.username)
     try:
+        concert_id = resolve_concert_id(conn, cart_item.concert_id, cart_item.item_name)
         cursor = conn.cursor()
-        cursor.execute(ADD_TO_CART, (cart_item.username, cart_item.item_name, cart_item.quantity))
+        cursor.execute(ADD_TO_CART, {
+            "user_id": current_user["id"],
+            "concert_id": concert_id,
+            "quantity": cart_item.quantity,
+        })
+        added = cursor.fetchone()
         conn.commit()
+        if not added:
+            raise HTTPException(status_code=409, detail="Концерт недоступен или билетов недостаточно")
         return {"status": "success", "message": "Item added to cart"}
+    except HTTPException:
+        raise
     except Exception as e:
         conn.rollback()
         print(f"Ошибка добавления в корзину: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Ошибка добавления в корзину: {str(e)}")
-    finally:
-        conn.close()
 
 
-from decimal import Decimal
 from datetime import datetime
 
+def format_cart_items(cart_items):
+    return [
+        {
+            "concert_id": item["concert_id"],
+            "item_name": item["item_name"],
+            "quantity": item["quantity"],
+            "price": float(item["price"]),
+            "created_at": item["created_at"].strftime("%d.%m.%Y %H:%M:%S")
+        }
+        for item in cart_items
+    ]
+
 @app.get("/cart/{username}", response_model=list[CartItem])
-def get_cart(username: str):
-    conn = get_connection()
+def get_cart(
+    username: str,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    current_user: dict = Depends(get_current_user),
+    conn=Depends(get_db),
+):
+    ensure_same_user(current_user, username)
     try:
         cursor = conn.cursor()
+        # В корзине показываются название и цена концерта, поэтому в ETag входит и поколение каталога
+        generation = concerts_cache.generation()
+        cursor.execute(GET_CART_VERSION, (current_user["id"],))
+        version = cursor.fetchone()
+        etag = make_etag("cart", current_user["id"], version["version"] if version else 0, generation)
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag, CART_CACHE_CONTROL)
+
         print(f"Получение корзины для пользователя: {username}")
-        cursor.execute(GET_CART_ITEMS, (username,))
+        cursor.execute(GET_CART_ITEMS, (current_user["id"],))
         cart_items = cursor.fetchall()
         print(f"Полученные элементы корзины: {cart_items}")
-        
-        formatted_items = []
-        for item in cart_items:
-            formatted_items.append({
-                "item_name": item["item_name"],
-                "quantity": item["quantity"],
-                "price": float(item["price"]),
-                "created_at": item["created_at"].strftime("%d.%m.%Y %H:%M:%S") 
-            })
-
-        return formatted_items
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = CART_CACHE_CONTROL
+        return format_cart_items(cart_items)
 
     except Exception as e:
         print(f"Ошибка загрузки корзины: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Ошибка загрузки корзины: {str(e)}")
-    finally:
-        conn.close()
+
+@app.put("/cart")
+def update_cart(request: CartUpdateRequest, current_user: dict = Depends(get_current_user), conn=Depends(get_db)):
+    ensure_same_user(current_user, request.username)
+    # Повторы одного концерта схлопываются: побеждает последнее значение
+    changes = {item.concert_id: item.quantity for item in request.items}
+    try:
+        cursor = conn.cursor()
+        cursor.execute(UPDATE_CART, {
+            "user_id": current_user["id"],
+            "concert_ids": list(changes.keys()),
+            "quantities": list(changes.values()),
+        })
+        rejected = [row["concert_id"] for row in cursor.fetchall() if not row["applied"]]
+        cursor.execute(GET_CART_ITEMS, (current_user["id"],))
+        items = format_cart_items(cursor.fetchall())
+        conn.commit()
+        return {"items": items, "rejected": rejected}
+    except Exception as e:
+        conn.rollback()
+        logging.error(f"Ошибка обновления корзины: {str(e)}")
+        raise HTTPException(status_code=500, detail="Ошибка обновления корзины")
 
 @app.delete("/cart/remove")
-def remove_from_cart(username: str, item_name: str):
-    conn = get_connection()
+def remove_from_cart(
+    concert_id: Optional[int] = None,
+    item_name: Optional[str] = None,
+    username: Optional[str] = None,
+    current_user: dict = Depends(get_current_user),
+    conn=Depends(get_db),
+):
+    ensure_same_user(current_user, username)
     try:
+        concert_id = resolve_concert_id(conn, concert_id, item_name)
         cursor = conn.cursor()
-        print(f"Удаление из корзины: {username}, {item_name}") 
-        cursor.execute(DELETE_FROM_CART, (username, item_name))
+        print(f"Удаление из корзины: {current_user['username']}, {concert_id}") 
+        cursor.execute(DELETE_FROM_CART, (current_user["id"], concert_id))
         removed_item = cursor.fetchone()
         conn.commit()
 
         if removed_item:
-            return {"status": "success", "message": f"{item_name} удален из корзины"}
+            return {"status": "success", "message": f"{item_name or concert_id} удален из корзины"}
         else:
             raise HTTPException(status_code=404, detail="Элемент не найден в корзине")
 
+    except HTTPException:
+        conn.rollback()
+        raise
     except Exception as e:
         conn.rollback()
         print(f"Ошибка удаления из корзины: {str(e)}") 
         raise HTTPException(status_code=500, detail=f"Ошибка удаления из корзины: {str(e)}")
-    finally:
-        conn.close()
 
 @app.get("/concerts/search")
-async def search_concerts(query: str = Query(..., description="Строка для поиска концертов")):
-    conn = get_connection()
+async def search_concerts(
+    response: Response,
+    query: str = Query(..., min_length=1, description="Строка для поиска концертов"),
+    limit: int = Query(20, ge=1, le=100, description="Количество результатов на странице"),
+    offset: int = Query(0, ge=0, description="Смещение от начала выдачи"),
+    if_none_match: Optional[str] = Header(None),
+):
+    # Выдача зависит только от concerts и параметров запроса, которые входят в URL
+    etag = make_etag("search", concerts_cache.generation())
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag, CATALOG_CACHE_CONTROL)
     try:
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT id, name, description, address, date, price, available 
-            FROM concerts 
-            WHERE name ILIKE %s
-        """, (f"%{query}%",))
-        
-        results = cursor.fetchall()
+        async with async_connection() as conn:
+            cursor = conn.cursor()
+
+            await cursor.execute(SEARCH_CONCERTS, {
+                "query": query,
+                "pattern": f"%{query}%",
+                "limit": limit,
+                "offset": offset,
+            })
+
+            results = cursor.fetchall()
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = CATALOG_CACHE_CONTROL
         return [
-            {"id": row['id'], "name": row['name'], "description": row['description'], "address": row['address'], "date": row['date'], "price": row['price'], "available": row['available']}
+            {"id": row['id'], "name": row['name'], "description": row['description'], "address": row['address'], "date": row['date'], "price": row['price'], "available": row['available'], "rank": row['rank']}
             for row in results
         ]
+    except PoolTimeout:
+        raise
     except Exception as e:
         logging.error(f"Ошибка при поиске концертов: {str(e)}")
         raise HTTPException(status_code=500, detail="Ошибка при поиске концертов")
-    finally:
-        conn.close()
 class CheckoutResponse(BaseModel):
     status: str
     message: str
+    order_ids: List[int] = []
 
 @app.post("/checkout/{username}", response_model=CheckoutResponse)
-def checkout(username: str):
-    conn = get_connection()
+def checkout(username: str, current_user: dict = Depends(get_current_user), conn=Depends(get_db)):
+    ensure_same_user(current_user, username)
     try:
         cursor = conn.cursor()
         print(f"Получен запрос на оформление заказа для пользователя: {username}")
+        user_id = current_user['id']
 
-        cursor.execute("SELECT id FROM users WHERE LOWER(username) = LOWER(%s)", (username,))
-        user = cursor.fetchone()
-        if not user:
-            raise HTTPException(status_code=404, detail="Пользователь не найден")
-        user_id = user['id']
-
-
-        cursor.execute("""
-            SELECT concerts_id, quantity 
-            FROM cart 
-            WHERE user_id = %s
-        """, (user_id,))
-        cart_items = cursor.fetchall()
+        # Корзина переносится в заказы одним запросом, независимо от числа позиций
+        cursor.execute(CHECKOUT_CART, {"user_id": user_id})
+        order_ids = [row["id"] for row in cursor.fetchall()]
+        conn.commit()
 
-        if not cart_items:
+        if not order_ids:
             return {"status": "error", "message": "Корзина пуста"}
 
-        print(f"Элементы корзины для пользователя {user_id}: {cart_items}")
-
-
-        for item in cart_items:
-            concerts_id, quantity = item['concerts_id'], item['quantity']
-            if not isinstance(concerts_id, int) or not isinstance(quantity, int):
-                raise HTTPException(status_code=500, detail="Неверные данные корзины")
-
-            cursor.execute("""
-                INSERT INTO orders (user_id, concerts_id, quantity, status)
-                VALUES (%s, %s, %s, %s)
-            """, (user_id, concerts_id, quantity, 'pending'))
-
-        cursor.execute("DELETE FROM cart WHERE user_id = %s", (user_id,))
-        conn.commit()
-
-        return {"status": "success", "message": "Все элементы корзины оформлены в заказы"}
+        return {"status": "success", "message": "Все элементы корзины оформлены в заказы", "order_ids": order_ids}
+    except psycopg2.Error as e:
+        conn.rollback()
+        if e.pgcode == TICKETS_SOLD_OUT:
+            # Отдельной транзакцией снимаем распроданный концерт с продажи
+            cursor = conn.cursor()
+            cursor.execute(REFRESH_CONCERT_AVAILABILITY, (int(e.diag.message_detail),))
+            conn.commit()
+            raise HTTPException(status_code=409, detail="Недостаточно билетов на один из концертов в корзине")
+        if e.pgcode == DEADLOCK_DETECTED:
+            raise HTTPException(status_code=409, detail="Высокая нагрузка на продажу билетов, повторите попытку")
+        raise HTTPException(status_code=500, detail=f"Ошибка при оформлении заказа: {str(e)}")
     except Exception as e:
         conn.rollback()
         raise HTTPException(status_code=500, detail=f"Ошибка при оформлении заказа: {str(e)}")
-    finally:
-        conn.close()
 from fastapi import FastAPI, HTTPException
 
+def format_unpaid_summary(summary):
+    return {
+        "user_id": summary["user_id"],
+        "total_price": summary["total_price"],
+        "order_count": summary["order_count"],
+        "status": summary["overall_status"]
+    }
+
+def format_orders(orders):
+    return [
+        {
+            "user_id": order["user_id"],
+            "concert_name": order["concert_name"],
+            "concert_price": float(order["concert_price"]),
+            "date": order["date"],
+            "quantity": order["quantity"],
+            "status": order["status"],
+        }
+        for order in orders
+    ]
+
 @app.get("/orders/{username}")
-def get_orders(username: str):
-    conn = get_connection()
+def get_orders(username: str, current_user: dict = Depends(get_current_user), conn=Depends(get_db)):
+    ensure_same_user(current_user, username)
     try:
         cursor = conn.cursor()
+        user_id = current_user["id"]
 
-        cursor.execute("SELECT id FROM users WHERE username = %s", (username,))
-        user = cursor.fetchone()
-        if not user:
-            raise HTTPException(status_code=404, detail="Пользователь не найден")
-
-        user_id = user["id"]
-
-        cursor.execute("""
-            SELECT 
-                o.user_id AS user_id,
-                SUM(m.price * o.quantity) AS total_price, -- Общая сумма неоплаченных товаров
-                COUNT(o.id) AS order_count,              -- Количество неоплаченных заказов
-                CASE 
-                    WHEN COUNT(DISTINCT o.status) = 1 THEN MAX(o.status)
-                    ELSE 'mixed'
-                END AS overall_status
-            FROM orders o
-            JOIN concerts m ON o.concerts_id = m.id
-            WHERE o.user_id = %s AND o.status = 'pending' -- Фильтруем только неоплаченные
-            GROUP BY o.user_id;
-        """, (user_id,))
+        cursor.execute(GET_UNPAID_SUMMARY, (user_id,))
 
 
         orders = cursor.fetchone()
         if not orders:
             return {"message": "У пользователя нет неоплаченных заказов"}
 
-        result = {
-            "user_id": orders["user_id"],
-            "total_price": orders["total_price"],
-            "order_count": orders["order_count"],
-            "status": orders["overall_status"]
-        }
-        return result
+        return format_unpaid_summary(orders)
 
     except Exception as e:
         print(f"Ошибка: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Ошибка при получении заказов: {str(e)}")
-    finally:
-        conn.close()
 
 @app.get("/orders1/{username}")
-def get_all_orders(username: str):
-    conn = get_connection()
+def get_all_orders(username: str, current_user: dict = Depends(get_current_user), conn=Depends(get_db)):
+    ensure_same_user(current_user, username)
     try:
-        cursor = conn.cursor(cursor_factory=DictCursor)
-
-        # Получение ID пользователя по имени
-        cursor.execute("SELECT id FROM users WHERE username = %s", (username,))
-        user = cursor.fetchone()
-        if not user:
-            raise HTTPException(status_code=404, detail="Пользователь не найден")
-
-        user_id = user["id"]
+        cursor = conn.cursor()
+        user_id = current_user["id"]
 
         # Получение всех заказов пользователя
-        cursor.execute("""
-            SELECT 
-                o.user_id AS user_id,
-                c.name AS concert_name,
-                c.price AS concert_price,
-                c.date AS date,
-                o.quantity AS quantity,
-                o.status AS status
-            FROM orders o
-            JOIN concerts c ON o.concerts_id = c.id
-            WHERE o.user_id = %s;
-        """, (user_id,))
+        cursor.execute(GET_USER_ORDERS, (user_id,))
 
         orders = cursor.fetchall()
         if not orders:
             return {"message": "У пользователя нет заказов"}
 
-        # Форматирование данных
-        formatted_orders = [
-            {
-                "user_id": order["user_id"],
-                "concert_name": order["concert_name"],
-                "concert_price": float(order["concert_price"]),
-                "date": order["date"],
-                "quantity": order["quantity"],
-                "status": order["status"],
-            }
-            for order in orders
-        ]
-        return formatted_orders
+        return format_orders(orders)
 
     except Exception as e:
         logging.error(f"Ошибка при получении заказов: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Ошибка при получении заказов: {str(e)}")
-    finally:
-        conn.close()
+
+
+OVERVIEW_FIELDS = ("cart", "summary", "orders")
+
+@app.get("/me/overview")
+def get_overview(
+    fields: str = Query(",".join(OVERVIEW_FIELDS), description="Разделы через запятую: cart, summary, orders"),
+    orders_limit: int = Query(20, ge=1, le=200, description="Сколько последних заказов вернуть"),
+    current_user: dict = Depends(get_current_user),
+    conn=Depends(get_db),
+):
+    """Корзина, сводка неоплаченных заказов и последние заказы текущего пользователя
+    за один запрос. Разделы читаются в одной транзакции REPEATABLE READ, поэтому
+    оформление заказа между чтениями не покажет один товар и в корзине, и в заказах."""
+    requested = {field.strip() for field in fields.split(",") if field.strip()}
+    unknown = requested - set(OVERVIEW_FIELDS)
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"Неизвестные разделы: {', '.join(sorted(unknown))}")
+    user_id = current_user["id"]
+    try:
+        cursor = conn.cursor()
+        cursor.execute(BEGIN_SNAPSHOT)
+        overview = {"user_id": user_id, "username": current_user["username"]}
+        if "cart" in requested:
+            cursor.execute(GET_CART_ITEMS, (user_id,))
+            overview["cart"] = format_cart_items(cursor.fetchall())
+        if "summary" in requested:
+            cursor.execute(GET_UNPAID_SUMMARY, (user_id,))
+            summary = cursor.fetchone()
+            overview["summary"] = format_unpaid_summary(summary) if summary else None
+        if "orders" in requested:
+            cursor.execute(GET_RECENT_USER_ORDERS, (user_id, orders_limit))
+            overview["orders"] = format_orders(cursor.fetchall())
+        conn.commit()
+        return overview
+    except Exception as e:
+        conn.rollback()
+        logging.error(f"Ошибка при получении данных пользователя: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Ошибка при получении данных пользователя: {str(e)}")
 
 
 @app.post("/pay_order/{user_id}")
@@ -566,18 +896,15 @@ def pay_order(
     user_id: int,
     payment_method: str = Body(..., example="credit_card"),
     amount: float = Body(..., example=100.50),
+    current_user: dict = Depends(get_current_user),
+    conn=Depends(get_db),
 ):
-    conn = get_connection()
+    if user_id != current_user["id"]:
+        raise HTTPException(status_code=403, detail="Нет доступа к заказам другого пользователя")
     try:
         cursor = conn.cursor()
 
-        cursor.execute("""
-            SELECT 
-                SUM(m.price * o.quantity) AS total_price
-            FROM orders o
-            JOIN concerts m ON o.concerts_id = m.id
-            WHERE o.user_id = %s AND o.status = 'pending'
-        """, (user_id,))
+        cursor.execute(GET_UNPAID_TOTAL, (user_id,))
         result = cursor.fetchone()
         total_price = result["total_price"] if result and result["total_price"] else 0
 
@@ -586,21 +913,12 @@ def pay_order(
         if amount < total_price:
             raise HTTPException(status_code=400, detail=f"Сумма оплаты ({amount}) недостаточна, требуется {total_price}")
 
-        cursor.execute("""
-            UPDATE orders
-            SET status = 'paid'
-            WHERE user_id = %s AND status = 'pending'
-        """, (user_id,))
+        cursor.execute(PAY_ORDERS, (user_id,))
 
-        cursor.execute("""
-            INSERT INTO payments (order_id, payment_method, amount, status)
-            VALUES (%s, %s, %s, %s)
-        """, (1, payment_method, amount, "completed"))
+        cursor.execute(CREATE_PAYMENT, (1, payment_method, amount, "completed"))
         conn.commit()
         return {"status": "success", "message": f"Заказ успешно оплачен"}
     except Exception as e:
         conn.rollback()
         raise HTTPException(status_code=500, detail=f"Ошибка при оплате заказов: {str(e)}")
-    finally:
-        conn.close()
 
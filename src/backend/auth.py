@@ -2,6 +2,13 @@ from datetime import datetime, timedelta
 from jose import jwt
 from passlib.context import CryptContext
 from dotenv import load_dotenv
+from concurrent.futures import ProcessPoolExecutor
+from cachetools import LRUCache
+from fastapi import Depends, HTTPException
+from fastapi.security import OAuth2PasswordBearer
+import asyncio
+import threading
+import time
 import os
 
 from passlib.context import CryptContext
@@ -13,7 +20,18 @@ SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES"))
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Настройки хеширования паролей
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+AUTH_POOL_SIZE = int(os.getenv("AUTH_POOL_SIZE", str(os.cpu_count() or 1)))
+AUTH_QUEUE_LIMIT = int(os.getenv("AUTH_QUEUE_LIMIT", str(AUTH_POOL_SIZE * 8)))
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+
+class AuthPoolSaturated(Exception):
+    pass
+
 
 def hash_password(password: str) -> str:
     return pwd_context.hash(password)
@@ -21,6 +39,71 @@ def hash_password(password: str) -> str:
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
+
+class PasswordHasherPool:
+    """Выполняет bcrypt в отдельных процессах, чтобы хеширование не занимало GIL
+    и потоки API. Число задач в очереди ограничено: при переполнении запрос
+    отклоняется сразу, а не ждёт."""
+
+    def __init__(self, size, queue_limit):
+        self.size = size
+        self.queue_limit = queue_limit
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._rejected = 0
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.size)
+            return self._executor
+
+    def _acquire(self):
+        with self._lock:
+            if self._pending >= self.queue_limit:
+                self._rejected += 1
+                raise AuthPoolSaturated("Сервис авторизации перегружен, повторите попытку позже")
+            self._pending += 1
+
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
+
+    async def run(self, func, *args):
+        self._acquire()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), func, *args)
+        finally:
+            self._release()
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": self.size,
+                "queue_limit": self.queue_limit,
+                "pending": self._pending,
+                "rejected": self._rejected,
+            }
+
+
+hasher_pool = PasswordHasherPool(AUTH_POOL_SIZE, AUTH_QUEUE_LIMIT)
+
+
+async def hash_password_async(password: str) -> str:
+    return await hasher_pool.run(hash_password, password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await hasher_pool.run(verify_password, plain_password, hashed_password)
+
+
 def create_access_token(data: dict, expires_delta: timedelta = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)):
     to_encode = data.copy()
     expire = datetime.utcnow() + expires_delta
@@ -37,4 +120,40 @@ def decode_access_token(token: str):
         raise HTTPException(status_code=401, detail="Invalid token claims")
     except Exception as e:
         raise HTTPException(status_code=401, detail=f"Could not validate token: {str(e)}")
- 
+
+
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
+
+# Проверенные токены: подпись проверяется один раз, дальше до истечения срока берём из кэша
+_token_cache = LRUCache(maxsize=TOKEN_CACHE_SIZE)
+_token_cache_lock = threading.Lock()
+
+
+def resolve_token(token: str) -> dict:
+    now = time.time()
+    with _token_cache_lock:
+        user = _token_cache.get(token)
+    if user is not None:
+        if user["exp"] > now:
+            return user
+        with _token_cache_lock:
+            _token_cache.pop(token, None)
+        raise HTTPException(status_code=401, detail="Token has expired")
+
+    payload = decode_access_token(token)
+    if "user_id" not in payload or "username" not in payload:
+        raise HTTPException(status_code=401, detail="Invalid token claims")
+    user = {
+        "id": payload["user_id"],
+        "username": payload["username"],
+        "role": payload.get("role"),
+        "exp": payload["exp"],
+    }
+    with _token_cache_lock:
+        _token_cache[token] = user
+    return user
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> dict:
+    """FastAPI-зависимость: пользователь из bearer-токена без обращения к базе."""
+    return resolve_token(token)
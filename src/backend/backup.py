@@ -0,0 +1,264 @@
+from dotenv import load_dotenv
+import asyncio
+import logging
+import os
+import shutil
+import tarfile
+import time
+import uuid
+
+from backend.cache import invalidate_all
+from backend.database import DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD
+
+load_dotenv()
+
+# Каталог для резервных копий, число параллельных процессов pg_dump,
+# уровень сжатия (0-9) и сколько последних копий хранить на диске
+BACKUP_DIR = os.getenv("BACKUP_DIR", "/tmp/db_backups")
+BACKUP_JOBS = int(os.getenv("BACKUP_JOBS", "4"))
+BACKUP_COMPRESSION = int(os.getenv("BACKUP_COMPRESSION", "6"))
+BACKUP_KEEP = int(os.getenv("BACKUP_KEEP", "3"))
+# Число параллельных процессов pg_restore
+RESTORE_JOBS = int(os.getenv("RESTORE_JOBS", str(BACKUP_JOBS)))
+
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+logger = logging.getLogger(__name__)
+
+# Задачи резервного копирования и восстановления: id -> состояние. Живут в памяти процесса API
+_jobs = {}
+
+
+class JobConflict(Exception):
+    pass
+
+
+def _pg_env():
+    # Пароль передаётся через окружение, а не в командной строке
+    env = dict(os.environ)
+    if DB_PASSWORD:
+        env["PGPASSWORD"] = DB_PASSWORD
+    return env
+
+
+def _connection_args():
+    args = []
+    if DB_HOST:
+        args += ["-h", DB_HOST]
+    if DB_PORT:
+        args += ["-p", str(DB_PORT)]
+    if DB_USER:
+        args += ["-U", DB_USER]
+    return args
+
+
+def _public(job):
+    return {key: value for key, value in job.items() if not key.startswith("_")}
+
+
+def _running(kind):
+    return any(job["kind"] == kind and job["status"] in ("uploading", "queued", "running") for job in _jobs.values())
+
+
+def _new_job(kind, path):
+    job = {
+        "id": uuid.uuid4().hex,
+        "kind": kind,
+        "status": "queued",
+        "path": path,
+        "created_at": time.time(),
+        "finished_at": None,
+        "progress": 0,
+        "message": None,
+        "returncode": None,
+    }
+    _jobs[job["id"]] = job
+    return job
+
+
+async def _run(job, args):
+    """Запускает процесс и отслеживает его вывод. В режиме --verbose
+    pg_dump и pg_restore пишут по строке на каждый объект, psql — по строке
+    на каждую команду; число таких строк используется как показатель прогресса."""
+    job["status"] = "running"
+    try:
+        process = await asyncio.create_subprocess_exec(
+            *args, env=_pg_env(), stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT
+        )
+        job["_process"] = process
+        async for line in process.stdout:
+            job["progress"] += 1
+            job["message"] = line.decode(errors="replace").strip()
+        job["returncode"] = await process.wait()
+        job["status"] = "done" if job["returncode"] == 0 else "failed"
+    except asyncio.CancelledError:
+        job["status"] = "failed"
+        job["message"] = "Задача прервана при остановке сервера"
+        raise
+    except Exception as e:
+        logger.error(f"Ошибка задачи {job['kind']} {job['id']}: {e}")
+        job["status"] = "failed"
+        job["message"] = str(e)
+    finally:
+        job["finished_at"] = time.time()
+        job.pop("_process", None)
+
+
+def _cleanup_backups():
+    backups = sorted(
+        (job for job in _jobs.values() if job["kind"] == "backup" and job["status"] in ("done", "failed")),
+        key=lambda job: job["created_at"],
+    )
+    for job in (backups[:-BACKUP_KEEP] if BACKUP_KEEP > 0 else backups):
+        shutil.rmtree(job["path"], ignore_errors=True)
+        del _jobs[job["id"]]
+
+
+def start_backup():
+    """Запускает pg_dump в фоне: формат directory, BACKUP_JOBS потоков выгрузки
+    таблиц и сжатие каждого файла данных. Возвращает состояние задачи.
+    Вызывается из цикла событий (асинхронного маршрута)."""
+    if _running("backup"):
+        raise JobConflict("Резервное копирование уже выполняется")
+    _cleanup_backups()
+    os.makedirs(BACKUP_DIR, exist_ok=True)
+    job = _new_job("backup", None)
+    job["path"] = os.path.join(BACKUP_DIR, f"backup_{time.strftime('%Y%m%d_%H%M%S')}_{job['id'][:8]}")
+    args = [
+        "pg_dump", *_connection_args(), "-d", DB_NAME or "postgres",
+        "-Fd", "-j", str(BACKUP_JOBS), "-Z", str(BACKUP_COMPRESSION),
+        "-f", job["path"], "--verbose",
+    ]
+    try:
+        job["_task"] = asyncio.create_task(_run(job, args))
+    except Exception:
+        # Задача не запустилась: без удаления она навсегда осталась бы «queued»
+        # и _running("backup") отклонял бы все следующие запросы
+        del _jobs[job["id"]]
+        raise
+    return _public(job)
+
+
+def detect_archive_format(path):
+    """custom — архив pg_dump -Fc, directory — tar-архив каталога pg_dump -Fd
+    (как его отдаёт /admin/backup/{id}/download), plain — обычный SQL."""
+    with open(path, "rb") as f:
+        header = f.read(tarfile.BLOCKSIZE)
+    if header.startswith(b"PGDMP"):
+        return "custom"
+    if tarfile.is_tarfile(path):
+        return "directory"
+    return "plain"
+
+
+def _extract_directory_archive(path, target):
+    with tarfile.open(path, "r:*") as archive:
+        archive.extractall(target, filter="data")
+    for root, _, files in os.walk(target):
+        if "toc.dat" in files:
+            return root
+    raise ValueError("В архиве нет toc.dat: это не резервная копия в формате directory")
+
+
+async def _restore(job):
+    workdir = job["_workdir"]
+    try:
+        job["format"] = detect_archive_format(job["path"])
+        if job["format"] == "plain":
+            # Обычный SQL выполняется только последовательно
+            args = ["psql", *_connection_args(), "-d", DB_NAME or "postgres", "-v", "ON_ERROR_STOP=1", "-f", job["path"]]
+        else:
+            source = job["path"]
+            if job["format"] == "directory":
+                job["message"] = "Распаковка архива"
+                source = await asyncio.to_thread(_extract_directory_archive, job["path"], os.path.join(workdir, "archive"))
+            args = [
+                "pg_restore", *_connection_args(), "-d", DB_NAME or "postgres",
+                "--clean", "--if-exists", "--no-owner", "-j", str(RESTORE_JOBS), "--verbose", source,
+            ]
+        await _run(job, args)
+        if job["status"] == "done":
+            invalidate_all()
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.error(f"Ошибка восстановления {job['id']}: {e}")
+        job["status"] = "failed"
+        job["message"] = str(e)
+        job["finished_at"] = time.time()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+async def start_restore(upload):
+    """Сохраняет загруженный файл на диск порциями по UPLOAD_CHUNK_SIZE и
+    запускает восстановление в фоне: pg_restore с RESTORE_JOBS потоками для
+    архивов custom и directory, psql для обычного SQL."""
+    if _running("restore"):
+        raise JobConflict("Восстановление уже выполняется")
+    job = _new_job("restore", None)
+    job["status"] = "uploading"
+    job["_workdir"] = os.path.join(BACKUP_DIR, f"restore_{job['id']}")
+    job["path"] = os.path.join(job["_workdir"], "upload")
+    try:
+        os.makedirs(job["_workdir"], exist_ok=True)
+        with open(job["path"], "wb") as f:
+            await asyncio.to_thread(shutil.copyfileobj, upload, f, UPLOAD_CHUNK_SIZE)
+        job["size"] = os.path.getsize(job["path"])
+    except Exception as e:
+        shutil.rmtree(job["_workdir"], ignore_errors=True)
+        job["status"] = "failed"
+        job["message"] = f"Ошибка загрузки файла: {e}"
+        job["finished_at"] = time.time()
+        raise
+    job["status"] = "queued"
+    job["_task"] = asyncio.create_task(_restore(job))
+    return _public(job)
+
+
+def get_job(job_id):
+    job = _jobs.get(job_id)
+    return _public(job) if job else None
+
+
+def list_jobs(kind=None):
+    return [_public(job) for job in _jobs.values() if kind is None or job["kind"] == kind]
+
+
+def cancel_jobs():
+    for job in _jobs.values():
+        process = job.get("_process")
+        if process and process.returncode is None:
+            process.terminate()
+        task = job.get("_task")
+        if task and not task.done():
+            task.cancel()
+
+
+def _tar_entries(path):
+    prefix = os.path.basename(path)
+    for root, _, files in os.walk(path):
+        for name in sorted(files):
+            full_path = os.path.join(root, name)
+            yield full_path, os.path.join(prefix, os.path.relpath(full_path, path))
+
+
+def stream_backup(job_id):
+    """Отдаёт каталог резервной копии одним tar-потоком. Файлы данных уже
+    сжаты pg_dump, поэтому tar не сжимается, а файлы читаются порциями:
+    в памяти находится не больше DOWNLOAD_CHUNK_SIZE байт."""
+    path = _jobs[job_id]["path"]
+    for full_path, arcname in _tar_entries(path):
+        info = tarfile.TarInfo(arcname)
+        info.size = os.path.getsize(full_path)
+        info.mtime = int(os.path.getmtime(full_path))
+        yield info.tobuf(tarfile.PAX_FORMAT)
+        with open(full_path, "rb") as f:
+            while chunk := f.read(DOWNLOAD_CHUNK_SIZE):
+                yield chunk
+        padding = -info.size % tarfile.BLOCKSIZE
+        if padding:
+            yield tarfile.NUL * padding
+    # Конец архива: два пустых блока
+    yield tarfile.NUL * (2 * tarfile.BLOCKSIZE)
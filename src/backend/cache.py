@@ -0,0 +1,170 @@
+from cachetools import LRUCache
+from dotenv import load_dotenv
+import asyncio
+import logging
+import os
+import threading
+import time
+import uuid
+
+from backend.database import AsyncConnection
+
+load_dotenv()
+
+CATALOG_CACHE_TTL = float(os.getenv("CATALOG_CACHE_TTL", "300"))
+CONCERT_ID_CACHE_SIZE = int(os.getenv("CONCERT_ID_CACHE_SIZE", "4096"))
+# Сколько секунд клиент может не перепроверять каталог; 0 — проверять каждый раз через ETag
+CATALOG_MAX_AGE = int(os.getenv("CATALOG_MAX_AGE", "0"))
+
+# Поколения кэша живут в памяти процесса, поэтому ETag включает идентификатор
+# запуска: после перезапуска или на другом воркере старый ETag просто не совпадёт
+BOOT_ID = uuid.uuid4().hex[:12]
+
+CATALOG_CACHE_CONTROL = f"public, max-age={CATALOG_MAX_AGE}" if CATALOG_MAX_AGE > 0 else "public, no-cache"
+CART_CACHE_CONTROL = "private, no-cache"
+
+# Канал, в который триггер на таблице concerts отправляет уведомления
+CONCERTS_CHANNEL = "concerts_changed"
+
+logger = logging.getLogger(__name__)
+
+
+class SerializedCache:
+    """Хранит готовое JSON-тело ответа. Инвалидация увеличивает поколение,
+    поэтому результат запроса, начатого до инвалидации, в кэш не попадёт."""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._body = None
+        self._expires_at = 0.0
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self):
+        body = self._body
+        if body is not None and time.monotonic() < self._expires_at:
+            self.hits += 1
+            return body
+        self.misses += 1
+        return None
+
+    def generation(self):
+        return self._generation
+
+    def set(self, body, generation):
+        with self._lock:
+            if generation != self._generation:
+                return False
+            self._body = body
+            self._expires_at = time.monotonic() + self.ttl
+            return True
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._body = None
+
+    def stats(self):
+        return {
+            "cached": self._body is not None,
+            "generation": self._generation,
+            "hits": self.hits,
+            "misses": self.misses,
+            "ttl": self.ttl,
+        }
+
+
+class ConcertIdCache:
+    """Ограниченный LRU-кэш имя концерта -> id для вызовов API по имени.
+    Отсутствующие имена не кэшируются, а сброс по уведомлению concerts_changed
+    учитывает переименование и удаление концертов."""
+
+    def __init__(self, maxsize):
+        self._lock = threading.Lock()
+        self._ids = LRUCache(maxsize=maxsize)
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def resolve(self, name, load):
+        with self._lock:
+            concert_id = self._ids.get(name)
+            generation = self._generation
+        if concert_id is not None:
+            self.hits += 1
+            return concert_id
+        self.misses += 1
+        concert_id = load(name)
+        if concert_id is not None:
+            with self._lock:
+                if generation == self._generation:
+                    self._ids[name] = concert_id
+        return concert_id
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._ids.clear()
+
+    def stats(self):
+        return {
+            "size": len(self._ids),
+            "maxsize": self._ids.maxsize,
+            "generation": self._generation,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+concerts_cache = SerializedCache(CATALOG_CACHE_TTL)
+concert_ids = ConcertIdCache(CONCERT_ID_CACHE_SIZE)
+
+_channel_handlers = {
+    CONCERTS_CHANNEL: [concerts_cache.invalidate, concert_ids.invalidate],
+}
+
+
+async def listen_for_invalidations(retry_delay=5):
+    """Подписывается на каналы инвалидации, чтобы изменения concerts, сделанные
+    другими воркерами или напрямую в базе, сразу сбрасывали кэш."""
+    while True:
+        conn = None
+        try:
+            conn = await AsyncConnection.connect()
+            for channel in _channel_handlers:
+                await conn.execute(f"LISTEN {channel}")
+            # Пока соединения не было, уведомления могли потеряться
+            invalidate_all()
+            async for notify in conn.notifications():
+                for handler in _channel_handlers.get(notify.channel, []):
+                    handler()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Ошибка подписки на инвалидацию кэша: {str(e)}")
+            invalidate_all()
+            await asyncio.sleep(retry_delay)
+        finally:
+            if conn is not None:
+                conn.close()
+
+
+def invalidate_all():
+    for handlers in _channel_handlers.values():
+        for handler in handlers:
+            handler()
+
+
+def make_etag(*parts):
+    return '"' + "-".join(str(part) for part in (BOOT_ID, *parts)) + '"'
+
+
+def etag_matches(if_none_match, etag):
+    """Сравнение для If-None-Match (RFC 9110): список тегов или *, слабые теги допускаются."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
@@ -0,0 +1,197 @@
+from dotenv import load_dotenv
+import codecs
+import csv
+import json
+import os
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from backend.queries import (
+    CREATE_CONCERT_IMPORT_STAGING, COPY_CONCERT_IMPORT, MERGE_CONCERT_IMPORT, SET_IMPORTED_CAPACITY,
+)
+
+load_dotenv()
+
+# Сколько ошибок по строкам возвращать в отчёте; остальные только подсчитываются
+IMPORT_MAX_ERRORS = int(os.getenv("IMPORT_MAX_ERRORS", "1000"))
+
+COPY_BUFFER_SIZE = 64 * 1024
+
+NAME_MAX_LENGTH = 100
+PRICE_LIMIT = Decimal("100000000")
+
+
+class ImportReport:
+    def __init__(self, max_errors=IMPORT_MAX_ERRORS):
+        self.max_errors = max_errors
+        self.received = 0
+        self.valid = 0
+        self.error_count = 0
+        self.errors = []
+        # Имя концерта -> номер последней строки с ним и заданная вместимость
+        self.lines = {}
+        self.capacities = {}
+
+    def error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"line": line, "error": message})
+
+
+def _text(value):
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def validate_row(raw):
+    """Проверяет и приводит одну строку импорта. Возвращает кортеж значений
+    для staging-таблицы или выбрасывает ValueError с описанием ошибки."""
+    if not isinstance(raw, dict):
+        raise ValueError("строка должна быть объектом")
+
+    name = _text(raw.get("name"))
+    if not name:
+        raise ValueError("не указано название")
+    if len(name) > NAME_MAX_LENGTH:
+        raise ValueError(f"название длиннее {NAME_MAX_LENGTH} символов")
+
+    try:
+        price = Decimal(str(raw.get("price")).strip()).quantize(Decimal("0.01"))
+    except (InvalidOperation, ValueError):
+        raise ValueError("некорректная цена")
+    if not price.is_finite() or price < 0 or price >= PRICE_LIMIT:
+        raise ValueError("цена вне допустимого диапазона")
+
+    date = _text(raw.get("date"))
+    if date is not None:
+        try:
+            date = datetime.fromisoformat(date)
+        except ValueError:
+            raise ValueError("некорректная дата, ожидается ISO 8601")
+
+    capacity = _text(raw.get("capacity"))
+    if capacity is not None:
+        try:
+            capacity = int(capacity)
+        except ValueError:
+            raise ValueError("некорректная вместимость")
+        if capacity < 0:
+            raise ValueError("вместимость не может быть отрицательной")
+
+    return name, _text(raw.get("description")), _text(raw.get("address")), price, date, capacity
+
+
+def _csv_rows(stream):
+    reader = csv.DictReader(codecs.getreader("utf-8")(stream))
+    for row in reader:
+        # Первая строка CSV — заголовок, строки данных нумеруются с 2
+        yield reader.line_num, row
+
+
+def _ndjson_rows(stream):
+    for line, raw in enumerate(codecs.getreader("utf-8")(stream), start=1):
+        if not raw.strip():
+            continue
+        try:
+            yield line, json.loads(raw)
+        except json.JSONDecodeError as e:
+            yield line, ValueError(f"некорректный JSON: {e.msg}")
+
+
+def _copy_value(value):
+    if value is None:
+        return "\\N"
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def _copy_lines(rows, report):
+    for line, raw in rows:
+        report.received += 1
+        try:
+            if isinstance(raw, Exception):
+                raise raw
+            values = validate_row(raw)
+        except ValueError as e:
+            report.error(line, str(e))
+            continue
+        name, capacity = values[0], values[5]
+        if name in report.lines:
+            report.error(report.lines[name], f"название повторяется в строке {line}, загружена она")
+        report.lines[name] = line
+        if capacity is not None:
+            report.capacities[name] = line
+        else:
+            report.capacities.pop(name, None)
+        report.valid += 1
+        yield "\t".join(_copy_value(value) for value in (line, *values)) + "\n"
+
+
+class _CopyStream:
+    """Файлоподобный объект для copy_expert: отдаёт провалидированные
+    строки по мере чтения, поэтому файл не загружается в память целиком."""
+
+    def __init__(self, lines):
+        self._lines = lines
+        self._buffer = b""
+
+    def read(self, size=COPY_BUFFER_SIZE):
+        size = size if size and size > 0 else COPY_BUFFER_SIZE
+        while len(self._buffer) < size:
+            line = next(self._lines, None)
+            if line is None:
+                break
+            self._buffer += line.encode()
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+def import_concerts(conn, stream, file_format, overwrite, shards):
+    """Загружает концерты из CSV или NDJSON: строки проверяются по одной
+    и потоком передаются через COPY во временную таблицу, затем одним
+    INSERT ... ON CONFLICT (name) сливаются в concerts. Транзакцию
+    фиксирует вызывающий код."""
+    report = ImportReport()
+    rows = _csv_rows(stream) if file_format == "csv" else _ndjson_rows(stream)
+
+    with conn.cursor() as cursor:
+        cursor.execute(CREATE_CONCERT_IMPORT_STAGING)
+        cursor.copy_expert(COPY_CONCERT_IMPORT, _CopyStream(_copy_lines(rows, report)))
+
+        cursor.execute(MERGE_CONCERT_IMPORT, {"overwrite": overwrite})
+        merged = cursor.fetchall()
+        inserted = sum(1 for row in merged if row["inserted"])
+        merged_ids = [row["id"] for row in merged]
+        merged_names = {row["name"] for row in merged}
+
+        for name, line in report.lines.items():
+            if name not in merged_names:
+                report.error(line, "концерт с таким названием уже существует")
+
+        capacity_names = set()
+        if report.capacities and merged_ids:
+            cursor.execute(SET_IMPORTED_CAPACITY, {"concert_ids": merged_ids, "shards": shards})
+            capacity_names = {row["name"] for row in cursor.fetchall()}
+        for name, line in report.capacities.items():
+            if name in merged_names and name not in capacity_names:
+                report.error(line, "вместимость меньше числа уже проданных билетов")
+
+    report.errors.sort(key=lambda error: error["line"])
+    return {
+        "received": report.received,
+        "valid": report.valid,
+        "inserted": inserted,
+        "updated": len(merged) - inserted,
+        "error_count": report.error_count,
+        "errors": report.errors,
+        "errors_truncated": report.error_count > len(report.errors),
+    }
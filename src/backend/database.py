@@ -1,9 +1,22 @@
-from psycopg2.extras import RealDictCursor
 from dotenv import load_dotenv
+from contextlib import contextmanager, asynccontextmanager
+import asyncio
+import logging
 import os
+import re
+import threading
+import time
+from datetime import date, timedelta
 import psycopg2
+from psycopg2 import extensions
 from psycopg2 import sql
 
+from backend.prepared import (
+    DB_PREPARED_STATEMENTS, STATEMENTS, PreparingConnection, PreparingCursor, prepare_catalog, statement_name,
+)
+from backend.metrics import observe_query
+from backend.queries import CHECK_UNPAID_SUMMARY, REBUILD_UNPAID_SUMMARY
+
 # Загружаем переменные окружения из .env файла
 load_dotenv()
 
@@ -14,6 +27,27 @@ DB_NAME = os.getenv("DB_NAME")
 DB_USER = os.getenv("DB_USER")
 DB_PASSWORD = os.getenv("DB_PASSWORD")
 
+# Настройки пула соединений
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "2"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))
+DB_POOL_CHECK_ON_BORROW = os.getenv("DB_POOL_CHECK_ON_BORROW", "true").lower() == "true"
+
+# Секционирование журнала событий: шаг секций (month или day), сколько секций
+# создавать наперёд, сколько хранить и что делать с устаревшими (drop или detach)
+EVENT_LOGS_PARTITION_INTERVAL = os.getenv("EVENT_LOGS_PARTITION_INTERVAL", "month")
+EVENT_LOGS_PREMAKE = int(os.getenv("EVENT_LOGS_PREMAKE", "3"))
+EVENT_LOGS_RETENTION = int(os.getenv("EVENT_LOGS_RETENTION", "12"))
+EVENT_LOGS_RETENTION_ACTION = os.getenv("EVENT_LOGS_RETENTION_ACTION", "drop")
+EVENT_LOGS_MAINTENANCE_PERIOD = float(os.getenv("EVENT_LOGS_MAINTENANCE_PERIOD", "3600"))
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(Exception):
+    pass
+
+
 def get_connection():
     try:
         conn = psycopg2.connect(
@@ -22,30 +56,801 @@ def get_connection():
             database=DB_NAME,
             user=DB_USER,
             password=DB_PASSWORD,
-            cursor_factory=RealDictCursor
+            connection_factory=PreparingConnection,
+            cursor_factory=PreparingCursor
         )
         return conn
     except Exception as e:
         print("Ошибка подключения к базе данных:", e)
         raise
 
+
+class ConnectionPool:
+    """Потокобезопасный пул соединений с ограничением размера,
+    таймаутом ожидания и проверкой соединения при выдаче."""
+
+    def __init__(self, minconn, maxconn, timeout, check_on_borrow=True, connect=get_connection):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError("Некорректные границы пула соединений")
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.check_on_borrow = check_on_borrow
+        self._connect = connect
+        self._idle = []
+        self._in_use = set()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._waiting = 0
+        self._waits = 0
+        self._timeouts = 0
+        self._created = 0
+        self._discarded = 0
+        for _ in range(minconn):
+            self._idle.append(self._new_connection())
+
+    def _new_connection(self):
+        conn = self._connect()
+        self._created += 1
+        return conn
+
+    def _is_alive(self, conn):
+        if conn.closed:
+            return False
+        if not self.check_on_borrow:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, conn):
+        self._discarded += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def getconn(self):
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            waited = False
+            while True:
+                if self._closed:
+                    raise PoolTimeout("Пул соединений закрыт")
+                if self._idle:
+                    conn = self._idle.pop()
+                    break
+                if len(self._in_use) < self.maxconn:
+                    conn = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout(
+                        f"Не удалось получить соединение из пула за {self.timeout} с"
+                    )
+                if not waited:
+                    waited = True
+                    self._waits += 1
+                self._waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+            # Резервируем слот до установки соединения, чтобы не превысить maxconn
+            placeholder = object()
+            self._in_use.add(placeholder)
+
+        try:
+            if conn is not None and not self._is_alive(conn):
+                self._discard(conn)
+                conn = None
+            if conn is None:
+                conn = self._new_connection()
+        except Exception:
+            with self._cond:
+                self._in_use.discard(placeholder)
+                self._cond.notify()
+            raise
+
+        with self._cond:
+            self._in_use.discard(placeholder)
+            self._in_use.add(conn)
+        return conn
+
+    def putconn(self, conn, close=False):
+        with self._cond:
+            self._in_use.discard(conn)
+            if not close and not conn.closed:
+                # Незавершённую транзакцию откатываем, чтобы соединение вернулось чистым
+                try:
+                    if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                        conn.rollback()
+                except psycopg2.Error:
+                    close = True
+            if close or conn.closed or self._closed or len(self._idle) >= self.maxconn:
+                self._discard(conn)
+            else:
+                self._idle.append(conn)
+            self._cond.notify()
+
+    def closeall(self):
+        with self._cond:
+            self._closed = True
+            for conn in self._idle:
+                self._discard(conn)
+            self._idle.clear()
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "min_size": self.minconn,
+                "max_size": self.maxconn,
+                "in_use": len(self._in_use),
+                "idle": len(self._idle),
+                "waiting": self._waiting,
+                "waits": self._waits,
+                "timeouts": self._timeouts,
+                "created": self._created,
+                "discarded": self._discarded,
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def connect_prepared():
+    # Новое соединение пула, в том числе взамен разорванного, сразу готовит каталог запросов
+    return prepare_catalog(get_connection())
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    DB_POOL_MIN,
+                    DB_POOL_MAX,
+                    DB_POOL_TIMEOUT,
+                    check_on_borrow=DB_POOL_CHECK_ON_BORROW,
+                    connect=connect_prepared,
+                )
+    return _pool
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+
+
+@contextmanager
+def connection():
+    pool = get_pool()
+    conn = pool.getconn()
+    broken = False
+    try:
+        yield conn
+    except psycopg2.InterfaceError:
+        broken = True
+        raise
+    finally:
+        pool.putconn(conn, close=broken or conn.closed != 0)
+
+
+def get_db():
+    """FastAPI-зависимость: выдаёт соединение из пула на время запроса."""
+    with connection() as conn:
+        yield conn
+
+
+def pool_stats():
+    if _pool is None:
+        return {"min_size": DB_POOL_MIN, "max_size": DB_POOL_MAX, "in_use": 0, "idle": 0,
+                "waiting": 0, "waits": 0, "timeouts": 0, "created": 0, "discarded": 0}
+    return _pool.stats()
+
+
+# Асинхронный слой: неблокирующий режим psycopg2 поверх цикла событий asyncio
+
+async def _wait(conn):
+    loop = asyncio.get_running_loop()
+    fd = conn.fileno()
+    while True:
+        state = conn.poll()
+        if state == extensions.POLL_OK:
+            return
+        future = loop.create_future()
+
+        def ready():
+            if not future.done():
+                future.set_result(None)
+
+        if state == extensions.POLL_READ:
+            loop.add_reader(fd, ready)
+            try:
+                await future
+            finally:
+                loop.remove_reader(fd)
+        elif state == extensions.POLL_WRITE:
+            loop.add_writer(fd, ready)
+            try:
+                await future
+            finally:
+                loop.remove_writer(fd)
+        else:
+            raise psycopg2.OperationalError(f"Неожиданное состояние соединения: {state}")
+
+
+class AsyncCursor:
+    """Курсор асинхронного соединения. execute ожидает ответ сервера,
+    fetch-методы читают уже полученные строки и не блокируют."""
+
+    def __init__(self, conn, cursor):
+        self._conn = conn
+        self._cursor = cursor
+
+    async def execute(self, query, params=None):
+        started = time.perf_counter()
+        failed = True
+        try:
+            self._cursor.execute(query, params)
+            await _wait(self._conn)
+            failed = False
+        finally:
+            observe_query(statement_name(query), time.perf_counter() - started, failed)
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def fetchmany(self, size=None):
+        return self._cursor.fetchmany(size) if size else self._cursor.fetchmany()
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def close(self):
+        self._cursor.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class AsyncConnection:
+    """Соединение в асинхронном режиме psycopg2. Такое соединение работает
+    в режиме autocommit, поэтому транзакции открываются явно через transaction()."""
+
+    def __init__(self, raw):
+        self.raw = raw
+
+    @classmethod
+    async def connect(cls):
+        raw = psycopg2.connect(
+            host=DB_HOST,
+            port=DB_PORT,
+            database=DB_NAME,
+            user=DB_USER,
+            password=DB_PASSWORD,
+            async_=True,
+            connection_factory=PreparingConnection,
+        )
+        try:
+            await _wait(raw)
+        except Exception:
+            raw.close()
+            raise
+        return cls(raw)
+
+    @classmethod
+    async def connect_prepared(cls):
+        conn = await cls.connect()
+        try:
+            await conn.prepare_catalog()
+        except Exception:
+            conn.close()
+            raise
+        return conn
+
+    async def prepare_catalog(self):
+        """Асинхронный вариант prepare_catalog: соединение в режиме autocommit,
+        поэтому неудачный PREPARE не прерывает подготовку остальных."""
+        if not DB_PREPARED_STATEMENTS:
+            return
+        for statement in STATEMENTS.values():
+            try:
+                await self.execute(statement.prepare_sql)
+                self.raw.prepared.add(statement.name)
+            except psycopg2.Error as e:
+                logger.debug(f"Оператор {statement.query_name} не подготовлен: {e}")
+
+    @property
+    def closed(self):
+        return self.raw.closed
+
+    def is_busy(self):
+        return self.raw.isexecuting()
+
+    def cursor(self):
+        return AsyncCursor(self.raw, self.raw.cursor(cursor_factory=PreparingCursor))
+
+    async def execute(self, query, params=None):
+        with self.cursor() as cursor:
+            await cursor.execute(query, params)
+
+    @asynccontextmanager
+    async def transaction(self):
+        await self.execute("BEGIN")
+        try:
+            yield self
+        except BaseException:
+            if not self.raw.closed and not self.raw.isexecuting():
+                await self.execute("ROLLBACK")
+            raise
+        await self.execute("COMMIT")
+
+    async def notifications(self):
+        """Бесконечно выдаёт уведомления NOTIFY по каналам, на которые подписано соединение."""
+        loop = asyncio.get_running_loop()
+        fd = self.raw.fileno()
+        while True:
+            while self.raw.notifies:
+                yield self.raw.notifies.pop(0)
+            future = loop.create_future()
+
+            def ready():
+                if not future.done():
+                    future.set_result(None)
+
+            loop.add_reader(fd, ready)
+            try:
+                await future
+            finally:
+                loop.remove_reader(fd)
+            await _wait(self.raw)
+
+    def close(self):
+        self.raw.close()
+
+
+class AsyncConnectionPool:
+    """Пул асинхронных соединений с теми же настройками, что и ConnectionPool."""
+
+    def __init__(self, minconn, maxconn, timeout, check_on_borrow=True, connect=AsyncConnection.connect_prepared):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError("Некорректные границы пула соединений")
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.check_on_borrow = check_on_borrow
+        self._connect = connect
+        self._idle = []
+        self._in_use = 0
+        self._cond = asyncio.Condition()
+        self._closed = False
+        self._waiting = 0
+        self._waits = 0
+        self._timeouts = 0
+        self._created = 0
+        self._discarded = 0
+
+    async def open(self):
+        for _ in range(self.minconn):
+            self._idle.append(await self._new_connection())
+
+    async def _new_connection(self):
+        conn = await self._connect()
+        self._created += 1
+        return conn
+
+    async def _is_alive(self, conn):
+        if conn.closed:
+            return False
+        if not self.check_on_borrow:
+            return True
+        try:
+            await conn.execute("SELECT 1")
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, conn):
+        self._discarded += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    async def getconn(self):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        async with self._cond:
+            waited = False
+            while True:
+                if self._closed:
+                    raise PoolTimeout("Пул соединений закрыт")
+                if self._idle or self._in_use < self.maxconn:
+                    break
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout(
+                        f"Не удалось получить соединение из пула за {self.timeout} с"
+                    )
+                if not waited:
+                    waited = True
+                    self._waits += 1
+                self._waiting += 1
+                try:
+                    await asyncio.wait_for(self._cond.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+                finally:
+                    self._waiting -= 1
+            conn = self._idle.pop() if self._idle else None
+            self._in_use += 1
+
+        try:
+            if conn is not None and not await self._is_alive(conn):
+                self._discard(conn)
+                conn = None
+            if conn is None:
+                conn = await self._new_connection()
+        except BaseException:
+            if conn is not None:
+                self._discard(conn)
+            await self._release_slot()
+            raise
+        return conn
+
+    async def _release_slot(self):
+        async with self._cond:
+            self._in_use -= 1
+            self._cond.notify()
+
+    async def putconn(self, conn, close=False):
+        # Соединение, прерванное посреди запроса (например, при отмене задачи), повторно не используется
+        if close or conn.closed or conn.is_busy() or self._closed or len(self._idle) >= self.maxconn:
+            self._discard(conn)
+        else:
+            self._idle.append(conn)
+        await self._release_slot()
+
+    async def closeall(self):
+        async with self._cond:
+            self._closed = True
+            for conn in self._idle:
+                self._discard(conn)
+            self._idle.clear()
+            self._cond.notify_all()
+
+    def stats(self):
+        return {
+            "min_size": self.minconn,
+            "max_size": self.maxconn,
+            "in_use": self._in_use,
+            "idle": len(self._idle),
+            "waiting": self._waiting,
+            "waits": self._waits,
+            "timeouts": self._timeouts,
+            "created": self._created,
+            "discarded": self._discarded,
+        }
+
+
+_async_pool = None
+
+
+async def open_async_pool():
+    global _async_pool
+    if _async_pool is None:
+        _async_pool = AsyncConnectionPool(
+            DB_POOL_MIN,
+            DB_POOL_MAX,
+            DB_POOL_TIMEOUT,
+            check_on_borrow=DB_POOL_CHECK_ON_BORROW,
+        )
+        await _async_pool.open()
+    return _async_pool
+
+
+async def close_async_pool():
+    global _async_pool
+    if _async_pool is not None:
+        pool, _async_pool = _async_pool, None
+        await pool.closeall()
+
+
+@asynccontextmanager
+async def async_connection():
+    pool = await open_async_pool()
+    conn = await pool.getconn()
+    broken = False
+    try:
+        yield conn
+    except psycopg2.InterfaceError:
+        broken = True
+        raise
+    finally:
+        await pool.putconn(conn, close=broken)
+
+
+async def get_async_db():
+    """FastAPI-зависимость для async-маршрутов: соединение из асинхронного пула."""
+    async with async_connection() as conn:
+        yield conn
+
+
+def async_pool_stats():
+    if _async_pool is None:
+        return {"min_size": DB_POOL_MIN, "max_size": DB_POOL_MAX, "in_use": 0, "idle": 0,
+                "waiting": 0, "waits": 0, "timeouts": 0, "created": 0, "discarded": 0}
+    return _async_pool.stats()
+
+
+# Обслуживание секций event_logs
+
+_PARTITION_NAME = re.compile(r"^event_logs_p(\d{8}|\d{6})$")
+
+# Произвольный ключ advisory-блокировки, чтобы обслуживание не шло в нескольких воркерах сразу
+_PARTITION_MAINTENANCE_LOCK = 740_211
+
+
+def _period_start(day, interval):
+    return day if interval == "day" else day.replace(day=1)
+
+
+def _next_period(start, interval):
+    if interval == "day":
+        return start + timedelta(days=1)
+    return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def _shift_periods(start, interval, count):
+    if interval == "day":
+        return start + timedelta(days=count)
+    months = start.year * 12 + start.month - 1 + count
+    return date(months // 12, months % 12 + 1, 1)
+
+
+def _partition_name(start, interval):
+    return "event_logs_p" + start.strftime("%Y%m%d" if interval == "day" else "%Y%m")
+
+
+def _partition_range(name):
+    match = _PARTITION_NAME.match(name)
+    if not match:
+        return None
+    suffix = match.group(1)
+    if len(suffix) == 8:
+        start = date(int(suffix[:4]), int(suffix[4:6]), int(suffix[6:]))
+        return start, _next_period(start, "day")
+    start = date(int(suffix[:4]), int(suffix[4:]), 1)
+    return start, _next_period(start, "month")
+
+
+def _move_default_rows(cursor, name, start, end):
+    """Создаёт секцию [start, end), когда в секции DEFAULT уже есть строки за этот
+    период: иначе CREATE TABLE ... PARTITION OF откажет, а вместе с ним
+    откатится и всё обслуживание. DEFAULT отсоединяется на время переноса,
+    возвращается после него; возвращает число перенесённых строк."""
+    cursor.execute("ALTER TABLE event_logs DETACH PARTITION event_logs_default")
+    cursor.execute(
+        sql.SQL("CREATE TABLE {} PARTITION OF event_logs FOR VALUES FROM (%s) TO (%s)").format(sql.Identifier(name)),
+        (start, end),
+    )
+    cursor.execute(
+        sql.SQL("""
+            WITH moved AS (
+                DELETE FROM event_logs_default
+                WHERE created_at >= %s AND created_at < %s
+                RETURNING *
+            )
+            INSERT INTO {} SELECT * FROM moved
+        """).format(sql.Identifier(name)),
+        (start, end),
+    )
+    moved = cursor.rowcount
+    cursor.execute("ALTER TABLE event_logs ATTACH PARTITION event_logs_default DEFAULT")
+    return moved
+
+
+def maintain_event_log_partitions(
+    interval=EVENT_LOGS_PARTITION_INTERVAL,
+    premake=EVENT_LOGS_PREMAKE,
+    retention=EVENT_LOGS_RETENTION,
+    action=EVENT_LOGS_RETENTION_ACTION,
+    today=None,
+):
+    """Создаёт секции event_logs на premake периодов вперёд и удаляет
+    (или отсоединяет) секции, целиком старше retention периодов."""
+    if interval not in ("day", "month"):
+        raise ValueError(f"Неизвестный шаг секционирования: {interval}")
+    if action not in ("drop", "detach"):
+        raise ValueError(f"Неизвестное действие для устаревших секций: {action}")
+
+    today = today or date.today()
+    current = _period_start(today, interval)
+    cutoff = _shift_periods(current, interval, -retention)
+    created, removed = [], []
+
+    with connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT pg_try_advisory_xact_lock(%s) AS locked", (_PARTITION_MAINTENANCE_LOCK,))
+            if not cursor.fetchone()["locked"]:
+                conn.rollback()
+                return {"created": created, "removed": removed, "skipped": True}
+
+            cursor.execute("""
+                SELECT c.relname AS name
+                FROM pg_inherits i
+                JOIN pg_class c ON c.oid = i.inhrelid
+                WHERE i.inhparent = 'event_logs'::regclass
+            """)
+            existing = {}
+            has_default = False
+            for row in cursor.fetchall():
+                has_default = has_default or row["name"] == "event_logs_default"
+                bounds = _partition_range(row["name"])
+                if bounds:
+                    existing[row["name"]] = bounds
+
+            start = current
+            for _ in range(premake + 1):
+                end = _next_period(start, interval)
+                overlaps = any(s < end and start < e for s, e in existing.values())
+                if not overlaps:
+                    name = _partition_name(start, interval)
+                    stray = False
+                    if has_default:
+                        cursor.execute(
+                            "SELECT EXISTS (SELECT 1 FROM event_logs_default WHERE created_at >= %s AND created_at < %s) AS stray",
+                            (start, end),
+                        )
+                        stray = cursor.fetchone()["stray"]
+                    if stray:
+                        moved = _move_default_rows(cursor, name, start, end)
+                        logger.warning(f"Секция {name}: перенесено строк из event_logs_default: {moved}")
+                    else:
+                        cursor.execute(
+                            sql.SQL("CREATE TABLE {} PARTITION OF event_logs FOR VALUES FROM (%s) TO (%s)").format(
+                                sql.Identifier(name)
+                            ),
+                            (start, end),
+                        )
+                    existing[name] = (start, end)
+                    created.append(name)
+                start = end
+
+            for name, (start, end) in sorted(existing.items(), key=lambda item: item[1]):
+                if end > cutoff:
+                    continue
+                if action == "detach":
+                    cursor.execute(
+                        sql.SQL("ALTER TABLE event_logs DETACH PARTITION {}").format(sql.Identifier(name))
+                    )
+                else:
+                    cursor.execute(sql.SQL("DROP TABLE {}").format(sql.Identifier(name)))
+                removed.append(name)
+        conn.commit()
+
+    if created or removed:
+        logger.info(f"Секции event_logs: созданы {created}, удалены {removed}")
+    return {"created": created, "removed": removed, "skipped": False}
+
+
+async def run_partition_maintenance(period=EVENT_LOGS_MAINTENANCE_PERIOD):
+    while True:
+        try:
+            await asyncio.to_thread(maintain_event_log_partitions)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Ошибка обслуживания секций event_logs: {str(e)}")
+        await asyncio.sleep(period)
+
+
+def check_unpaid_summary(rebuild=False):
+    """Сверяет user_unpaid_summary с пересчётом по orders. При rebuild=True
+    и найденных расхождениях сводка перестраивается с нуля."""
+    with connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(CHECK_UNPAID_SUMMARY)
+            mismatches = cursor.fetchall()
+            rebuilt = None
+            if rebuild and mismatches:
+                cursor.execute(REBUILD_UNPAID_SUMMARY)
+                rebuilt = cursor.fetchone()["rebuilt"]
+                logger.warning(f"Сводка неоплаченных заказов перестроена: {len(mismatches)} расхождений")
+        conn.commit()
+    return {"mismatches": mismatches, "rebuilt": rebuilt}
+
+
+def migration_scripts():
+    # init.sql создаёт базовую схему, затем применяются пронумерованные миграции
+    migrations_dir = os.path.join(os.path.dirname(__file__), "../../migrations")
+    numbered = sorted(
+        name for name in os.listdir(migrations_dir)
+        if name.endswith(".sql") and name[:1].isdigit()
+    )
+    return [os.path.join(migrations_dir, name) for name in ["init.sql", *numbered]]
+
+
+def applied_migrations(cursor):
+    """Имена уже применённых скриптов из schema_migrations."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            name TEXT PRIMARY KEY,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("SELECT name FROM schema_migrations")
+    applied = {row["name"] for row in cursor.fetchall()}
+    if not applied:
+        # База создана до учёта миграций: базовая схема init.sql в ней уже есть,
+        # а пронумерованные миграции идемпотентны и применяются повторно
+        cursor.execute("SELECT to_regclass('users') IS NOT NULL AS initialized")
+        if cursor.fetchone()["initialized"]:
+            cursor.execute("INSERT INTO schema_migrations (name) VALUES ('init.sql')")
+            applied.add("init.sql")
+    return applied
+
+
 def initialize_database():
+    """Применяет ещё не применённые скрипты из migrations по порядку. Каждый
+    скрипт выполняется в своей транзакции вместе с отметкой в schema_migrations,
+    поэтому после ошибки уже применённые миграции повторно не запускаются."""
     conn = None
     try:
         conn = get_connection()
         with conn.cursor() as cursor:
-            script_path = os.path.join(os.path.dirname(__file__), "../../migrations/init.sql")
-            with open(script_path, "r") as sql_file:
-                sql_script = sql_file.read()
-            cursor.execute(sql_script)
+            applied = applied_migrations(cursor)
             conn.commit()
+            for script_path in migration_scripts():
+                name = os.path.basename(script_path)
+                if name in applied:
+                    continue
+                with open(script_path, "r") as sql_file:
+                    sql_script = sql_file.read()
+                cursor.execute(sql_script)
+                cursor.execute("INSERT INTO schema_migrations (name) VALUES (%s)", (name,))
+                conn.commit()
+                print(f"Применена миграция {name}")
             print("База данных успешно инициализирована!")
     except Exception as e:
+        if conn:
+            conn.rollback()
         print("Ошибка инициализации базы данных:", e)
     finally:
         if conn:
-            conn.close()  
+            conn.close()
 
 
 if __name__ == "__main__":
-    initialize_database()
+    import sys
+
+    if sys.argv[1:] == ["maintain-partitions"]:
+        print(maintain_event_log_partitions())
+    elif sys.argv[1:2] == ["check-unpaid-summary"]:
+        print(check_unpaid_summary(rebuild="--rebuild" in sys.argv[2:]))
+    else:
+        initialize_database()
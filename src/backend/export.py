@@ -0,0 +1,130 @@
+from dotenv import load_dotenv
+import csv
+import io
+import json
+import os
+
+from backend.database import connection
+from backend.queries import EXPORT_ORDERS, EXPORT_PAYMENTS, EXPORT_REVIEWS
+
+load_dotenv()
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "5000"))
+
+EXPORTS = {
+    "orders": {
+        "query": EXPORT_ORDERS,
+        "columns": [
+            ("id", "int64"), ("user_id", "int64"), ("concerts_id", "int64"),
+            ("quantity", "int64"), ("status", "string"), ("created_at", "timestamp"),
+        ],
+    },
+    "payments": {
+        "query": EXPORT_PAYMENTS,
+        "columns": [
+            ("id", "int64"), ("order_id", "int64"), ("payment_method", "string"),
+            ("amount", "decimal"), ("status", "string"), ("created_at", "timestamp"),
+        ],
+    },
+    "reviews": {
+        "query": EXPORT_REVIEWS,
+        "columns": [
+            ("id", "int64"), ("user_id", "int64"), ("concerts_id", "int64"),
+            ("rating", "int64"), ("review", "string"), ("created_at", "timestamp"),
+        ],
+    },
+}
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def _batches(conn, query, batch_size):
+    # Именованный курсор: строки читаются с сервера порциями, а не целиком в память
+    with conn.cursor(name="export_cursor") as cursor:
+        cursor.itersize = batch_size
+        cursor.execute(query)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
+
+
+def _drain(buffer):
+    data = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate(0)
+    return data
+
+
+def _csv_chunks(batches, columns):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([name for name, _ in columns])
+    yield _drain(buffer).encode()
+    for rows in batches:
+        for row in rows:
+            writer.writerow([row[name] for name, _ in columns])
+        yield _drain(buffer).encode()
+
+
+def _ndjson_chunks(batches, columns):
+    yield b""
+    for rows in batches:
+        yield "".join(json.dumps(row, default=str, ensure_ascii=False) + "\n" for row in rows).encode()
+
+
+def _arrow_schema(columns):
+    import pyarrow as pa
+
+    types = {
+        "int64": pa.int64(),
+        "string": pa.string(),
+        "decimal": pa.decimal128(10, 2),
+        "timestamp": pa.timestamp("us"),
+    }
+    return pa.schema([(name, types[kind]) for name, kind in columns])
+
+
+def _arrow_chunks(batches, columns, file_format):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _arrow_schema(columns)
+    buffer = io.BytesIO()
+    if file_format == "parquet":
+        writer = pq.ParquetWriter(buffer, schema)
+        write = writer.write_table
+        to_chunk = pa.Table.from_pylist
+    else:
+        writer = pa.ipc.new_stream(buffer, schema)
+        write = writer.write_batch
+        to_chunk = pa.RecordBatch.from_pylist
+    try:
+        yield _drain(buffer)
+        for rows in batches:
+            write(to_chunk(rows, schema=schema))
+            yield _drain(buffer)
+    finally:
+        writer.close()
+    yield _drain(buffer)
+
+
+def stream_export(table, file_format, batch_size=EXPORT_BATCH_SIZE):
+    """Генератор байтов выгрузки. Первый фрагмент отдаётся сразу после
+    получения соединения, поэтому ошибки пула возникают до начала ответа."""
+    export = EXPORTS[table]
+    with connection() as conn:
+        batches = _batches(conn, export["query"], batch_size)
+        if file_format == "csv":
+            chunks = _csv_chunks(batches, export["columns"])
+        elif file_format == "ndjson":
+            chunks = _ndjson_chunks(batches, export["columns"])
+        else:
+            chunks = _arrow_chunks(batches, export["columns"], file_format)
+        yield from chunks
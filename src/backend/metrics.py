@@ -0,0 +1,207 @@
+from dotenv import load_dotenv
+import bisect
+import os
+import threading
+import time
+
+load_dotenv()
+
+# Сбор метрик запросов API и SQL; /metrics при выключенном сборе отдаёт только состояние пулов
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
+# Границы корзин гистограмм задержки в секундах
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+INF = float("inf")
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+def _number(value):
+    if value == INF:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return self._header() + [f"{self.name}{_labels(self.labels, key)} {_number(value)}" for key, value in values]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def set(self, value, *labels):
+        # Для счётчиков, которые ведёт сам пул: значение переносится из stats()
+        with self._lock:
+            self._values[labels] = value
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(_Metric):
+    """Гистограмма с фиксированными корзинами. Наблюдение — поиск корзины
+    и одно увеличение счётчика под блокировкой; накопленные суммы по корзинам
+    считаются только при выдаче /metrics."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                series = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self):
+        with self._lock:
+            values = sorted((key, list(counts), total) for key, (counts, total) in self._values.items())
+        lines = self._header()
+        bucket_labels = self.labels + ("le",)
+        for key, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (INF,), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(bucket_labels, key + (_number(bound),))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+HTTP_REQUESTS = Counter("http_requests_total", "Запросы к API по маршруту и коду ответа", ("method", "route", "status"))
+HTTP_ERRORS = Counter("http_request_errors_total", "Запросы к API, завершившиеся ошибкой 5xx", ("method", "route"))
+HTTP_LATENCY = Histogram("http_request_duration_seconds", "Время обработки запроса к API", ("method", "route"))
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "Запросы к API, обрабатываемые в данный момент")
+
+DB_QUERY_LATENCY = Histogram("db_query_duration_seconds", "Время выполнения SQL-запроса по имени из backend/queries.py", ("statement",))
+DB_QUERY_ERRORS = Counter("db_query_errors_total", "SQL-запросы, завершившиеся ошибкой", ("statement",))
+
+DB_POOL_CONNECTIONS = Gauge("db_pool_connections", "Соединения пула по состоянию", ("pool", "state"))
+DB_POOL_MAX = Gauge("db_pool_max_connections", "Максимальный размер пула соединений", ("pool",))
+DB_POOL_WAITING = Gauge("db_pool_waiting", "Запросы, ожидающие свободного соединения", ("pool",))
+DB_POOL_WAITS = Counter("db_pool_waits_total", "Сколько раз соединение пришлось ждать", ("pool",))
+DB_POOL_TIMEOUTS = Counter("db_pool_timeouts_total", "Сколько раз соединение не дождались", ("pool",))
+AUTH_POOL_PENDING = Gauge("auth_pool_pending", "Задачи хеширования паролей в очереди и в работе")
+AUTH_POOL_REJECTED = Counter("auth_pool_rejected_total", "Отклонённые задачи хеширования паролей")
+
+# Порядок вывода в /metrics
+REGISTRY = (
+    HTTP_REQUESTS, HTTP_ERRORS, HTTP_LATENCY, HTTP_IN_FLIGHT,
+    DB_QUERY_LATENCY, DB_QUERY_ERRORS,
+    DB_POOL_CONNECTIONS, DB_POOL_MAX, DB_POOL_WAITING, DB_POOL_WAITS, DB_POOL_TIMEOUTS,
+    AUTH_POOL_PENDING, AUTH_POOL_REJECTED,
+)
+
+
+def observe_query(statement, seconds, failed):
+    if not METRICS_ENABLED:
+        return
+    DB_QUERY_LATENCY.observe(seconds, statement)
+    if failed:
+        DB_QUERY_ERRORS.inc(statement)
+
+
+def set_pool_stats(pools, auth):
+    """Переносит stats() пулов соединений и пула хеширования в метрики.
+    Вызывается при каждом обращении к /metrics."""
+    for pool, stats in pools.items():
+        DB_POOL_CONNECTIONS.set(stats["in_use"], pool, "in_use")
+        DB_POOL_CONNECTIONS.set(stats["idle"], pool, "idle")
+        DB_POOL_MAX.set(stats["max_size"], pool)
+        DB_POOL_WAITING.set(stats["waiting"], pool)
+        DB_POOL_WAITS.set(stats["waits"], pool)
+        DB_POOL_TIMEOUTS.set(stats["timeouts"], pool)
+    AUTH_POOL_PENDING.set(auth["pending"])
+    AUTH_POOL_REJECTED.set(auth["rejected"])
+
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """ASGI-middleware: число запросов, ошибки, время ответа и запросы в работе.
+    Маршрут берётся из шаблона пути (/cart/{username}), а не из самого пути,
+    поэтому число рядов метрик не растёт с числом пользователей. Время считается
+    до отправки последней части тела, включая потоковые выгрузки."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            HTTP_IN_FLIGHT.dec()
+            route = scope.get("route")
+            path = route.path if route is not None else "unmatched"
+            method = scope["method"]
+            HTTP_REQUESTS.inc(method, path, str(status))
+            if status >= 500:
+                HTTP_ERRORS.inc(method, path)
+            HTTP_LATENCY.observe(elapsed, method, path)
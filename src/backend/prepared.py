@@ -0,0 +1,147 @@
+from dotenv import load_dotenv
+import logging
+import os
+import re
+import time
+
+from psycopg2 import extensions
+from psycopg2.extras import RealDictCursor
+
+from backend import queries
+from backend.metrics import observe_query
+
+load_dotenv()
+
+# Выполнять запросы каталога backend/queries.py как именованные подготовленные операторы
+DB_PREPARED_STATEMENTS = os.getenv("DB_PREPARED_STATEMENTS", "true").lower() == "true"
+
+SQL_PREFIXES = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+
+_PLACEHOLDER = re.compile(r"%\((\w+)\)s|%s|%%")
+
+logger = logging.getLogger(__name__)
+
+
+def catalog():
+    """Имена и тексты SQL-запросов из backend/queries.py."""
+    for name in dir(queries):
+        value = getattr(queries, name)
+        if name.isupper() and isinstance(value, str) and value.lstrip().upper().startswith(SQL_PREFIXES):
+            yield name, value
+
+
+class PreparedStatement:
+    """Запрос каталога, переписанный под PREPARE: плейсхолдеры psycopg2
+    (%s или %(имя)s) заменяются на $1, $2, ... в порядке появления."""
+
+    def __init__(self, name, query):
+        self.name = name.lower()
+        self.query_name = name
+        self.param_names = None
+        names = []
+        positional = 0
+
+        def replace(match):
+            nonlocal positional
+            if match.group(0) == "%%":
+                return "%"
+            if match.group(1) is None:
+                positional += 1
+                return f"${positional}"
+            if match.group(1) not in names:
+                names.append(match.group(1))
+            return f"${names.index(match.group(1)) + 1}"
+
+        body = _PLACEHOLDER.sub(replace, query).strip().rstrip(";")
+        if names and positional:
+            raise ValueError(f"{name}: смешаны именованные и позиционные параметры")
+        if names:
+            self.param_names = names
+        count = len(names) or positional
+        self.prepare_sql = f"PREPARE {self.name} AS {body}"
+        self.execute_sql = f"EXECUTE {self.name}" + (f" ({', '.join(['%s'] * count)})" if count else "")
+
+    def bind(self, vars):
+        if self.param_names is not None:
+            return tuple(vars[name] for name in self.param_names)
+        return tuple(vars or ())
+
+
+# Текст запроса -> подготовленный оператор. Курсор узнаёт запрос каталога по тексту,
+# поэтому вызовы cursor.execute(GET_CONCERTS, ...) менять не нужно
+STATEMENTS = {query: PreparedStatement(name, query) for name, query in catalog()}
+
+
+class PreparingConnection(extensions.connection):
+    """Соединение psycopg2, которое помнит, какие операторы на нём подготовлены.
+    Подготовленные операторы живут до закрытия сеанса, поэтому новое соединение
+    (в том числе после переподключения пула) готовит каталог заново."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+
+
+class PreparingCursor(RealDictCursor):
+    """Курсор, выполняющий запросы каталога через EXECUTE, если оператор
+    подготовлен на этом соединении. Прочие запросы выполняются как обычно.
+    Время выполнения записывается в метрики под именем запроса из каталога;
+    на асинхронном соединении execute только отправляет запрос, поэтому там
+    время измеряет AsyncCursor."""
+
+    def execute(self, query, vars=None):
+        if self.connection.async_:
+            return self._execute(query, vars)
+        started = time.perf_counter()
+        failed = True
+        try:
+            result = self._execute(query, vars)
+            failed = False
+            return result
+        finally:
+            observe_query(statement_name(query), time.perf_counter() - started, failed)
+
+    def _execute(self, query, vars):
+        statement = lookup(self.connection, query) if self.name is None else None
+        if statement is None:
+            return super().execute(query, vars)
+        return super().execute(statement.execute_sql, statement.bind(vars))
+
+
+def _statement(query):
+    # Запросы каталога — строки; составные запросы psycopg2.sql не хешируются
+    return STATEMENTS.get(query) if isinstance(query, str) else None
+
+
+def statement_name(query):
+    """Имя константы из backend/queries.py для метрик; прочие запросы — other."""
+    statement = _statement(query)
+    return statement.query_name if statement is not None else "other"
+
+
+def lookup(conn, query):
+    statement = _statement(query)
+    if statement is None or statement.name not in getattr(conn, "prepared", ()):
+        return None
+    return statement
+
+
+def prepare_catalog(conn):
+    """Готовит все запросы каталога на синхронном соединении. Запрос, который
+    не удалось подготовить (например, он читает временную таблицу), остаётся
+    обычным и выполняется без PREPARE."""
+    if not DB_PREPARED_STATEMENTS:
+        return conn
+    autocommit = conn.autocommit
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cursor:
+            for statement in STATEMENTS.values():
+                try:
+                    cursor.execute(statement.prepare_sql)
+                    conn.prepared.add(statement.name)
+                except Exception as e:
+                    logger.debug(f"Оператор {statement.query_name} не подготовлен: {e}")
+    finally:
+        conn.autocommit = autocommit
+    return conn
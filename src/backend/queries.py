@@ -35,26 +35,310 @@ INSERT INTO cart (username, item_name, quantity)
 VALUES (%s, %s, %s)
 """
 
+# Версия корзины поддерживается триггерами (migrations/009) и входит в ETag корзины
+GET_CART_VERSION = """
+SELECT version FROM cart_versions WHERE user_id = %s;
+"""
+
 GET_CART_ITEMS = """
-SELECT m.name AS item_name, c.quantity, m.price, c.created_at
+SELECT m.id AS concert_id, m.name AS item_name, c.quantity, m.price, c.created_at
 FROM cart c
 JOIN concerts m ON c.concerts_id = m.id
-WHERE c.user_id = (SELECT id FROM users WHERE username = %s);
+WHERE c.user_id = %s;
 """
 
+# Билеты, уже лежащие в корзине пользователя, вычитаются из остатка:
+# повторное добавление не должно превысить число свободных билетов
 ADD_TO_CART = """
-INSERT INTO cart (user_id, concerts_id, quantity) 
-VALUES (
-    (SELECT id FROM users WHERE username = %s),
-    (SELECT id FROM concerts WHERE name = %s),
-    %s
-);
+INSERT INTO cart (user_id, concerts_id, quantity)
+SELECT %(user_id)s::int, c.id, %(quantity)s::int
+FROM concerts c
+WHERE c.id = %(concert_id)s
+  AND c.available = TRUE
+  AND COALESCE(
+      (SELECT SUM(i.capacity - i.sold) FROM concert_inventory i WHERE i.concerts_id = c.id)
+        - COALESCE((SELECT ct.quantity FROM cart ct WHERE ct.user_id = %(user_id)s AND ct.concerts_id = c.id), 0),
+      %(quantity)s
+  ) >= %(quantity)s
+ON CONFLICT (user_id, concerts_id) DO UPDATE SET quantity = cart.quantity + EXCLUDED.quantity
+RETURNING id;
+"""
+
+# Пакетное изменение корзины одним оператором: количество задаётся
+# абсолютным значением, 0 удаляет позицию. applied = FALSE у концертов,
+# которые недоступны или на которые не хватает билетов
+UPDATE_CART = """
+WITH changes AS (
+    SELECT concerts_id, quantity
+    FROM unnest(%(concert_ids)s::int[], %(quantities)s::int[]) AS t(concerts_id, quantity)
+),
+removed AS (
+    DELETE FROM cart c
+    USING changes ch
+    WHERE c.user_id = %(user_id)s AND c.concerts_id = ch.concerts_id AND ch.quantity = 0
+    RETURNING c.concerts_id
+),
+saved AS (
+    INSERT INTO cart (user_id, concerts_id, quantity)
+    SELECT %(user_id)s::int, ch.concerts_id, ch.quantity
+    FROM changes ch
+    JOIN concerts c ON c.id = ch.concerts_id
+    WHERE ch.quantity > 0
+      AND c.available = TRUE
+      AND COALESCE(
+          (SELECT SUM(i.capacity - i.sold) FROM concert_inventory i WHERE i.concerts_id = c.id),
+          ch.quantity
+      ) >= ch.quantity
+    ON CONFLICT (user_id, concerts_id) DO UPDATE SET quantity = EXCLUDED.quantity
+    RETURNING concerts_id
+)
+SELECT ch.concerts_id AS concert_id, ch.quantity,
+       ch.quantity = 0 OR ch.concerts_id IN (SELECT concerts_id FROM saved) AS applied
+FROM changes ch;
 """
 DELETE_FROM_CART = """
-DELETE FROM cart 
-WHERE user_id = (SELECT id FROM users WHERE username = %s) 
-AND concerts_id = (SELECT id FROM concerts WHERE name = %s)
-RETURNING *;
+DELETE FROM cart
+WHERE user_id = %s AND concerts_id = %s
+RETURNING id;
+"""
+
+CHECKOUT_CART = """
+WITH moved AS (
+    DELETE FROM cart
+    WHERE user_id = %(user_id)s
+    RETURNING concerts_id, quantity
+),
+reserved AS (
+    -- Резервируем в порядке id концертов, чтобы одновременные оформления не блокировали друг друга крест-накрест
+    SELECT concerts_id, quantity, reserve_tickets(concerts_id, quantity)
+    FROM (SELECT concerts_id, quantity FROM moved ORDER BY concerts_id) AS m
+)
+INSERT INTO orders (user_id, concerts_id, quantity, status)
+SELECT %(user_id)s::int, concerts_id, quantity, 'pending'
+FROM reserved
+RETURNING id;
+"""
+
+# Код ошибки reserve_tickets при нехватке билетов
+TICKETS_SOLD_OUT = "TK001"
+
+SET_CONCERT_CAPACITY = """
+SELECT set_concert_capacity(%s, %s, %s);
+"""
+
+REFRESH_CONCERT_AVAILABILITY = """
+SELECT refresh_concert_availability(%s);
+"""
+
+GET_CONCERT_AVAILABILITY = """
+SELECT c.id, c.available, c.capacity, a.sold, a.remaining
+FROM concerts c
+LEFT JOIN concert_availability a ON a.concerts_id = c.id
+WHERE c.id = %s;
+"""
+
+# Таблицы, для которых поддерживается аудит изменений
+AUDITED_TABLES = ("users", "concerts", "orders", "cart", "user_info", "payments", "reviews")
+
+GET_AUDIT_SETTINGS = """
+SELECT table_name, mode, updated_at FROM audit_settings ORDER BY table_name;
+"""
+
+SET_AUDIT_MODE = """
+SELECT set_audit_mode(%s, %s);
+"""
+
+GET_CONCERT_ID_BY_NAME = """
+SELECT id FROM concerts WHERE name = %s;
+"""
+
+CREATE_REVIEW = """
+INSERT INTO reviews (user_id, concerts_id, rating, review)
+VALUES (%s, %s, %s, %s);
+"""
+
+GET_USER_INFO_FOR_UPDATE = """
+SELECT id FROM user_info WHERE user_id = %s FOR UPDATE;
+"""
+
+UPDATE_USER_INFO = """
+UPDATE user_info
+SET address = %s, name = %s, surname = %s, created_at = CURRENT_TIMESTAMP
+WHERE user_id = %s;
+"""
+
+CREATE_USER_INFO = """
+INSERT INTO user_info (user_id, address, name, surname, created_at)
+VALUES (%s, %s, %s, %s, CURRENT_TIMESTAMP);
+"""
+
+# Постраничная выдача для администратора: keyset по (created_at, id).
+# Параметры before_* задают позицию курсора, date_from/date_to — период;
+# когда они не нужны, передаются бесконечности, и текст запроса не меняется.
+GET_PAYMENTS = """
+SELECT id, order_id, payment_method, amount, status, created_at
+FROM payments
+WHERE (created_at, id) < (%(before_created_at)s::timestamp, %(before_id)s)
+  AND created_at >= %(date_from)s::timestamp
+  AND created_at < %(date_to)s::timestamp
+ORDER BY created_at DESC, id DESC
+LIMIT %(limit)s;
+"""
+
+GET_ALL_REVIEWS = """
+SELECT id, user_id, concerts_id, rating, review, created_at
+FROM reviews
+WHERE (created_at, id) < (%(before_created_at)s::timestamp, %(before_id)s)
+  AND created_at >= %(date_from)s::timestamp
+  AND created_at < %(date_to)s::timestamp
+ORDER BY created_at DESC, id DESC
+LIMIT %(limit)s;
+"""
+
+GET_ALL_ADDRESSES = """
+SELECT id, user_id, address, name, surname, created_at
+FROM user_info
+WHERE (created_at, id) < (%(before_created_at)s::timestamp, %(before_id)s)
+  AND created_at >= %(date_from)s::timestamp
+  AND created_at < %(date_to)s::timestamp
+ORDER BY created_at DESC, id DESC
+LIMIT %(limit)s;
+"""
+
+# Сводка неоплаченных заказов поддерживается триггерами (migrations/007), чтение — по первичному ключу
+GET_UNPAID_SUMMARY = """
+SELECT user_id, total_price, order_count, 'pending' AS overall_status
+FROM user_unpaid_summary
+WHERE user_id = %s AND order_count > 0;
+"""
+
+GET_USER_ORDERS = """
+SELECT
+    o.user_id AS user_id,
+    c.name AS concert_name,
+    c.price AS concert_price,
+    c.date AS date,
+    o.quantity AS quantity,
+    o.status AS status
+FROM orders o
+JOIN concerts c ON o.concerts_id = c.id
+WHERE o.user_id = %s;
+"""
+
+# Последние заказы пользователя для /me/overview, индекс orders_user_created_at_idx (migrations/010)
+GET_RECENT_USER_ORDERS = """
+SELECT
+    o.user_id AS user_id,
+    c.name AS concert_name,
+    c.price AS concert_price,
+    c.date AS date,
+    o.quantity AS quantity,
+    o.status AS status
+FROM orders o
+JOIN concerts c ON o.concerts_id = c.id
+WHERE o.user_id = %s
+ORDER BY o.created_at DESC, o.id DESC
+LIMIT %s;
+"""
+
+# Первая команда транзакции /me/overview: все чтения видят один снимок данных
+BEGIN_SNAPSHOT = """
+SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY;
+"""
+
+# Блокировка строки сводки: оформление заказа в параллельной транзакции
+# не добавит неоплаченных заказов между проверкой суммы и оплатой
+GET_UNPAID_TOTAL = """
+SELECT total_price
+FROM user_unpaid_summary
+WHERE user_id = %s AND order_count > 0
+FOR UPDATE;
+"""
+
+PAY_ORDERS = """
+UPDATE orders
+SET status = 'paid'
+WHERE user_id = %s AND status = 'pending';
+"""
+
+CREATE_PAYMENT = """
+INSERT INTO payments (order_id, payment_method, amount, status)
+VALUES (%s, %s, %s, %s);
+"""
+
+CHECK_UNPAID_SUMMARY = """
+SELECT * FROM check_unpaid_summary();
+"""
+
+REBUILD_UNPAID_SUMMARY = """
+SELECT rebuild_unpaid_summary() AS rebuilt;
+"""
+
+# Массовый импорт концертов: строки загружаются COPY во временную таблицу
+# и одним оператором сливаются в concerts
+CREATE_CONCERT_IMPORT_STAGING = """
+CREATE TEMP TABLE IF NOT EXISTS concert_import_staging (
+    line INT NOT NULL,
+    name VARCHAR(100) NOT NULL,
+    description TEXT,
+    address TEXT,
+    price NUMERIC(10, 2) NOT NULL,
+    date TIMESTAMP,
+    capacity INT
+) ON COMMIT DROP;
+"""
+
+COPY_CONCERT_IMPORT = """
+COPY concert_import_staging (line, name, description, address, price, date, capacity) FROM STDIN
+"""
+
+# Повтор названия в файле: побеждает последняя строка. Если overwrite = FALSE,
+# существующие концерты не меняются и не попадают в RETURNING
+MERGE_CONCERT_IMPORT = """
+WITH latest AS (
+    SELECT DISTINCT ON (name) name, description, address, price, date
+    FROM concert_import_staging
+    ORDER BY name, line DESC
+)
+INSERT INTO concerts AS c (name, description, address, price, date)
+SELECT name, description, address, price, date
+FROM latest
+ON CONFLICT (name) DO UPDATE
+SET description = EXCLUDED.description,
+    address = EXCLUDED.address,
+    price = EXCLUDED.price,
+    date = EXCLUDED.date
+WHERE %(overwrite)s
+RETURNING c.id, c.name, (c.xmax = 0) AS inserted;
+"""
+
+# Вместимость меньше уже проданных билетов пропускается, а не прерывает импорт
+SET_IMPORTED_CAPACITY = """
+WITH latest AS (
+    SELECT DISTINCT ON (name) name, capacity
+    FROM concert_import_staging
+    ORDER BY name, line DESC
+)
+SELECT c.name, set_concert_capacity(c.id, s.capacity, %(shards)s)
+FROM latest s
+JOIN concerts c ON c.name = s.name
+WHERE s.capacity IS NOT NULL
+  AND c.id = ANY(%(concert_ids)s)
+  AND s.capacity >= (SELECT COALESCE(SUM(i.sold), 0) FROM concert_inventory i WHERE i.concerts_id = c.id);
+"""
+
+# Полная выгрузка для бухгалтерии. Без ORDER BY: сортировка заставила бы
+# сервер прочитать всю таблицу до отдачи первой строки
+EXPORT_ORDERS = """
+SELECT id, user_id, concerts_id, quantity, status, created_at FROM orders;
+"""
+
+EXPORT_PAYMENTS = """
+SELECT id, order_id, payment_method, amount, status, created_at FROM payments;
+"""
+
+EXPORT_REVIEWS = """
+SELECT id, user_id, concerts_id, rating, review, created_at FROM reviews;
 """
 
 GET_REVIEWS = """
@@ -62,3 +346,13 @@ SELECT user_id, concerts_id, rating, review, created_at FROM reviews
 ORDER BY created_at DESC
 LIMIT 10;
 """
+
+SEARCH_CONCERTS = """
+SELECT c.id, c.name, c.description, c.address, c.date, c.price, c.available,
+       ts_rank_cd(c.search_vector, q.query) + similarity(c.name, %(query)s) AS rank
+FROM concerts c, websearch_to_tsquery('simple', %(query)s) AS q(query)
+WHERE c.available = TRUE
+  AND (c.search_vector @@ q.query OR c.name %% %(query)s OR c.name ILIKE %(pattern)s)
+ORDER BY rank DESC, c.id
+LIMIT %(limit)s OFFSET %(offset)s;
+"""
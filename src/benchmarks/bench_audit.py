@@ -0,0 +1,80 @@
+"""Пропускная способность записи при разных режимах аудита.
+
+Для каждого режима (off, row, statement) таблица orders переключается через
+set_audit_mode, после чего выполняются вставки, обновления и удаление.
+Всё, включая переключение триггеров, происходит в транзакции и откатывается.
+
+Запуск из каталога src (нужна база из .env):
+    python -m benchmarks.bench_audit --rows 5000
+"""
+import argparse
+import time
+
+from backend.database import get_connection
+from backend.queries import SET_AUDIT_MODE
+
+MODES = ("off", "row", "statement")
+
+
+def run(conn, mode, rows, batch):
+    timings = {}
+    with conn.cursor() as cursor:
+        cursor.execute(SET_AUDIT_MODE, ("orders", mode))
+        cursor.execute(
+            "INSERT INTO users (username, password_hash, role) VALUES ('bench_audit', '-', 'user') RETURNING id"
+        )
+        user_id = cursor.fetchone()["id"]
+        cursor.execute("SELECT id FROM concerts LIMIT 1")
+        concert_id = cursor.fetchone()["id"]
+
+        # Одиночные вставки: так пишет API
+        started = time.perf_counter()
+        for _ in range(rows):
+            cursor.execute(
+                "INSERT INTO orders (user_id, concerts_id, quantity) VALUES (%s, %s, 1)",
+                (user_id, concert_id),
+            )
+        timings["insert"] = rows / (time.perf_counter() - started)
+
+        # Пакетные вставки: так пишут оформление заказа и импорт
+        started = time.perf_counter()
+        for _ in range(rows // batch):
+            cursor.execute(
+                "INSERT INTO orders (user_id, concerts_id, quantity) SELECT %s, %s, 1 FROM generate_series(1, %s)",
+                (user_id, concert_id, batch),
+            )
+        timings["batch insert"] = (rows // batch * batch) / (time.perf_counter() - started)
+
+        started = time.perf_counter()
+        cursor.execute("UPDATE orders SET status = 'paid' WHERE user_id = %s", (user_id,))
+        updated = cursor.rowcount
+        timings["update"] = updated / (time.perf_counter() - started)
+
+        started = time.perf_counter()
+        cursor.execute("DELETE FROM orders WHERE user_id = %s", (user_id,))
+        deleted = cursor.rowcount
+        timings["delete"] = deleted / (time.perf_counter() - started)
+    conn.rollback()
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--batch", type=int, default=100)
+    args = parser.parse_args()
+
+    conn = get_connection()
+    try:
+        results = {mode: run(conn, mode, args.rows, args.batch) for mode in MODES}
+    finally:
+        conn.close()
+
+    operations = list(results["off"])
+    print(f"{'режим':>10} " + " ".join(f"{op + ', строк/с':>22}" for op in operations))
+    for mode, timings in results.items():
+        print(f"{mode:>10} " + " ".join(f"{timings[op]:>22.0f}" for op in operations))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Сравнение оформления заказа: построчные INSERT против одного запроса CHECKOUT_CART.
+
+Запуск из каталога src (нужна база из .env):
+    python -m benchmarks.bench_checkout --repeat 20
+Все изменения выполняются в транзакции и откатываются.
+"""
+import argparse
+import time
+
+from backend.database import get_connection
+from backend.queries import CHECKOUT_CART
+
+CART_SIZES = (1, 10, 100)
+
+
+def prepare(cursor, cart_size):
+    cursor.execute(
+        "INSERT INTO users (username, password_hash, role) VALUES ('bench_checkout', '-', 'user') RETURNING id"
+    )
+    user_id = cursor.fetchone()["id"]
+    cursor.execute(
+        """
+        INSERT INTO concerts (name, description, address, price, date)
+        SELECT 'bench_checkout_' || n, 'bench', 'bench', 10, CURRENT_TIMESTAMP
+        FROM generate_series(1, %s) AS n
+        RETURNING id
+        """,
+        (cart_size,),
+    )
+    concert_ids = [row["id"] for row in cursor.fetchall()]
+    return user_id, concert_ids
+
+
+def fill_cart(cursor, user_id, concert_ids):
+    cursor.execute(
+        "INSERT INTO cart (user_id, concerts_id, quantity) SELECT %s, unnest(%s::int[]), 1",
+        (user_id, concert_ids),
+    )
+
+
+def checkout_per_row(cursor, user_id):
+    cursor.execute("SELECT concerts_id, quantity FROM cart WHERE user_id = %s", (user_id,))
+    for item in cursor.fetchall():
+        cursor.execute(
+            "INSERT INTO orders (user_id, concerts_id, quantity, status) VALUES (%s, %s, %s, 'pending')",
+            (user_id, item["concerts_id"], item["quantity"]),
+        )
+    cursor.execute("DELETE FROM cart WHERE user_id = %s", (user_id,))
+
+
+def checkout_set_based(cursor, user_id):
+    cursor.execute(CHECKOUT_CART, {"user_id": user_id})
+    cursor.fetchall()
+
+
+def measure(conn, cart_size, checkout, repeat):
+    total = 0.0
+    for _ in range(repeat):
+        with conn.cursor() as cursor:
+            user_id, concert_ids = prepare(cursor, cart_size)
+            fill_cart(cursor, user_id, concert_ids)
+            started = time.perf_counter()
+            checkout(cursor, user_id)
+            total += time.perf_counter() - started
+        conn.rollback()
+    return total / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    conn = get_connection()
+    try:
+        print(f"{'позиций':>8} {'построчно, мс':>15} {'одним запросом, мс':>20}")
+        for cart_size in CART_SIZES:
+            per_row = measure(conn, cart_size, checkout_per_row, args.repeat)
+            set_based = measure(conn, cart_size, checkout_set_based, args.repeat)
+            print(f"{cart_size:>8} {per_row:>15.2f} {set_based:>20.2f}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Скорость массового импорта концертов.
+
+Сравнивает прежний путь (INSERT и commit на каждый концерт, как в /new_concert)
+с import_concerts: потоковая проверка, COPY во временную таблицу и одно
+слияние в concerts. Импорт выполняется в транзакции и откатывается.
+
+Запуск из каталога src (нужна база из .env):
+    python -m benchmarks.bench_concert_import --rows 20000
+"""
+import argparse
+import io
+import time
+
+from backend.concert_import import import_concerts
+from backend.database import get_connection
+from backend.queries import CREATE_CONCERT
+
+
+def make_csv(rows, offset):
+    lines = ["name,description,address,price,date,capacity"]
+    for n in range(offset, offset + rows):
+        lines.append(f"bench_import_{n},Description {n},Address {n},{10 + n % 90}.50,2030-01-01T19:00:00,{100 + n % 500}")
+    return "\n".join(lines).encode()
+
+
+def bench_single_inserts(conn, rows):
+    started = time.perf_counter()
+    with conn.cursor() as cursor:
+        for n in range(rows):
+            cursor.execute(CREATE_CONCERT, (f"bench_single_{n}", "d", "a", 10, "2030-01-01 19:00:00"))
+            conn.commit()
+    elapsed = time.perf_counter() - started
+    with conn.cursor() as cursor:
+        cursor.execute("DELETE FROM concerts WHERE name LIKE 'bench_single_%%'")
+    conn.commit()
+    return rows / elapsed
+
+
+def bench_import(conn, rows):
+    data = make_csv(rows, 0)
+    started = time.perf_counter()
+    report = import_concerts(conn, io.BytesIO(data), "csv", overwrite=True, shards=8)
+    elapsed = time.perf_counter() - started
+    conn.rollback()
+    assert report["inserted"] == rows, report
+    return rows / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--single-rows", type=int, default=1000)
+    args = parser.parse_args()
+
+    conn = get_connection()
+    try:
+        single = bench_single_inserts(conn, args.single_rows)
+        bulk = bench_import(conn, args.rows)
+    finally:
+        conn.close()
+
+    print(f"INSERT + commit на строку: {single:>10.0f} строк/с")
+    print(f"COPY + слияние:            {bulk:>10.0f} строк/с")
+
+
+if __name__ == "__main__":
+    main()
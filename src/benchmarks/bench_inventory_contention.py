@@ -0,0 +1,113 @@
+"""Нагрузочный тест продажи билетов одного «горячего» концерта.
+
+Множество клиентов одновременно вызывают reserve_tickets для одного концерта;
+сравниваются разные числа шардов остатка. Проверяется, что продано ровно
+столько, сколько мест, и не больше.
+
+Запуск из каталога src (нужна база из .env):
+    python -m benchmarks.bench_inventory_contention --clients 64 --capacity 5000
+"""
+import argparse
+import threading
+import time
+
+import psycopg2
+
+from backend.database import get_connection
+from backend.queries import SET_CONCERT_CAPACITY, TICKETS_SOLD_OUT
+
+
+def create_concert(capacity, shards):
+    conn = get_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                """
+                INSERT INTO concerts (name, description, address, price, date)
+                VALUES (%s, 'bench', 'bench', 10, CURRENT_TIMESTAMP)
+                RETURNING id
+                """,
+                (f"bench_inventory_{shards}_{time.time_ns()}",),
+            )
+            concert_id = cursor.fetchone()["id"]
+            cursor.execute(SET_CONCERT_CAPACITY, (concert_id, capacity, shards))
+        conn.commit()
+        return concert_id
+    finally:
+        conn.close()
+
+
+def buyer(concert_id, results, lock, start):
+    conn = get_connection()
+    sold = sold_out = retries = 0
+    try:
+        start.wait()
+        while True:
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT reserve_tickets(%s, 1)", (concert_id,))
+                conn.commit()
+                sold += 1
+            except psycopg2.Error as e:
+                conn.rollback()
+                if e.pgcode == TICKETS_SOLD_OUT:
+                    sold_out += 1
+                    break
+                retries += 1
+    finally:
+        conn.close()
+        with lock:
+            results["sold"] += sold
+            results["sold_out"] += sold_out
+            results["retries"] += retries
+
+
+def run(clients, capacity, shards):
+    concert_id = create_concert(capacity, shards)
+    results = {"sold": 0, "sold_out": 0, "retries": 0}
+    lock = threading.Lock()
+    start = threading.Barrier(clients + 1)
+    threads = [
+        threading.Thread(target=buyer, args=(concert_id, results, lock, start))
+        for _ in range(clients)
+    ]
+    for thread in threads:
+        thread.start()
+    start.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    conn = get_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT c.available, a.sold FROM concerts c JOIN concert_availability a ON a.concerts_id = c.id WHERE c.id = %s",
+                (concert_id,),
+            )
+            state = cursor.fetchone()
+            cursor.execute("DELETE FROM concerts WHERE id = %s", (concert_id,))
+        conn.commit()
+    finally:
+        conn.close()
+
+    assert state["sold"] == capacity == results["sold"], "Продано больше или меньше мест, чем есть"
+    return results["sold"] / elapsed, results["retries"], state["available"]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--capacity", type=int, default=5000)
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 4, 16])
+    args = parser.parse_args()
+
+    print(f"{'шардов':>7} {'билетов/с':>10} {'повторов':>9} {'available':>10}")
+    for shards in args.shards:
+        rate, retries, available = run(args.clients, args.capacity, shards)
+        print(f"{shards:>7} {rate:>10.1f} {retries:>9} {str(available):>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Пропускная способность проверки паролей (эквивалент /login) в пуле процессов.
+
+Запуск из каталога src:
+    python -m benchmarks.bench_password_hashing --requests 200
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from backend.auth import PasswordHasherPool, hash_password, verify_password
+
+
+async def run_logins(pool, hashed, requests_count, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one_login():
+        async with semaphore:
+            assert await pool.run(verify_password, "secret-password", hashed)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one_login() for _ in range(requests_count)))
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    hashed = hash_password("secret-password")
+
+    started = time.perf_counter()
+    for _ in range(args.requests // 10):
+        verify_password("secret-password", hashed)
+    inline_rate = (args.requests // 10) / (time.perf_counter() - started)
+    print(f"Без пула (в потоке API): {inline_rate:.1f} входов/с")
+
+    print(f"{'процессов':>10} {'входов/с':>10} {'на ядро':>10}")
+    workers = 1
+    while workers <= args.max_workers:
+        pool = PasswordHasherPool(workers, queue_limit=args.requests)
+        # Прогрев: запуск процессов не должен попадать в замер
+        asyncio.run(run_logins(pool, hashed, workers, workers))
+        elapsed = asyncio.run(run_logins(pool, hashed, args.requests, workers * 2))
+        pool.shutdown()
+        rate = args.requests / elapsed
+        print(f"{workers:>10} {rate:>10.1f} {rate / workers:>10.1f}")
+        workers *= 2
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Задержка запросов каталога с подготовленными операторами и без них.
+
+Каждый запрос выполняется --iterations раз на одном соединении: сначала
+обычным текстом (разбор и планирование на каждый вызов), затем через
+EXECUTE после prepare_catalog. Запросы только читают данные.
+
+Запуск из каталога src (нужна база из .env):
+    python -m benchmarks.bench_prepared_statements --iterations 2000
+"""
+import argparse
+import statistics
+import time
+
+from backend import queries
+from backend.database import get_connection
+from backend.prepared import prepare_catalog
+
+
+def sample_params(cursor):
+    cursor.execute("SELECT id, username FROM users ORDER BY id LIMIT 1")
+    user = cursor.fetchone()
+    cursor.execute("SELECT id, name FROM concerts ORDER BY id LIMIT 1")
+    concert = cursor.fetchone()
+    if user is None or concert is None:
+        raise SystemExit("Нужны хотя бы один пользователь и один концерт")
+    return {
+        "GET_USER_BY_USERNAME": (user["username"],),
+        "GET_CONCERTS": None,
+        "GET_CART_ITEMS": (user["id"],),
+        "GET_UNPAID_SUMMARY": (user["id"],),
+        "GET_CONCERT_AVAILABILITY": (concert["id"],),
+        "GET_CONCERT_ID_BY_NAME": (concert["name"],),
+        "SEARCH_CONCERTS": {"query": concert["name"], "pattern": f"%{concert['name']}%", "limit": 20, "offset": 0},
+    }
+
+
+def measure(conn, query, params, iterations):
+    timings = []
+    with conn.cursor() as cursor:
+        for _ in range(iterations):
+            started = time.perf_counter()
+            cursor.execute(query, params)
+            cursor.fetchall()
+            timings.append(time.perf_counter() - started)
+    conn.rollback()
+    return statistics.median(timings) * 1_000_000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    conn = get_connection()
+    try:
+        with conn.cursor() as cursor:
+            params = sample_params(cursor)
+        conn.rollback()
+
+        plain = {name: measure(conn, getattr(queries, name), p, args.iterations) for name, p in params.items()}
+        prepare_catalog(conn)
+        prepared = {name: measure(conn, getattr(queries, name), p, args.iterations) for name, p in params.items()}
+    finally:
+        conn.close()
+
+    print(f"{'запрос':<28} {'обычный, мкс':>14} {'PREPARE, мкс':>14} {'ускорение':>10}")
+    for name in params:
+        print(f"{name:<28} {plain[name]:>14.1f} {prepared[name]:>14.1f} {plain[name] / prepared[name]:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""Проверка планов запросов на крупном наборе данных.
+
+Скрипт в транзакции заполняет базу данными объёмом, близким к боевому,
+выполняет EXPLAIN для каждого запроса из backend/queries.py и завершается
+с ошибкой, если какой-либо план читает крупную таблицу последовательным
+сканированием. Все изменения откатываются.
+
+Запуск из каталога src (нужна база из .env):
+    python -m benchmarks.check_query_plans --scale 1
+"""
+import argparse
+import json
+import sys
+
+from backend.database import get_connection
+from backend.prepared import catalog
+from backend.queries import AUDITED_TABLES, SET_AUDIT_MODE, CREATE_CONCERT_IMPORT_STAGING
+
+# Таблицы, которые заполняются и на которых последовательное сканирование считается регрессией
+WATCHED_TABLES = {"users", "concerts", "orders", "cart", "reviews", "payments", "user_info", "user_unpaid_summary", "cart_versions"}
+
+# Запросы, которым последовательное сканирование разрешено: они читают почти всю таблицу
+ALLOWED_SEQ_SCANS = {
+    "GET_CONCERTS": {"concerts"},
+    "EXPORT_ORDERS": {"orders"},
+    "EXPORT_PAYMENTS": {"payments"},
+    "EXPORT_REVIEWS": {"reviews"},
+    # Диагностика сводки: намеренный полный пересчёт по orders и concerts
+    "CHECK_UNPAID_SUMMARY": {"orders", "concerts", "user_unpaid_summary"},
+}
+
+
+def seed(cursor, scale):
+    users = 50_000 * scale
+    concerts = 20_000 * scale
+    for table in AUDITED_TABLES:
+        cursor.execute(SET_AUDIT_MODE, (table, "off"))
+    cursor.execute(
+        """
+        INSERT INTO users (username, password_hash, role)
+        SELECT 'plan_user_' || n, '-', 'user' FROM generate_series(1, %s) AS n
+        """,
+        (users,),
+    )
+    cursor.execute(
+        """
+        INSERT INTO concerts (name, description, address, price, date, available)
+        SELECT 'plan_concert_' || n, 'description ' || n, 'address ' || n, 10 + n %% 90,
+               CURRENT_TIMESTAMP + n * INTERVAL '1 hour', n %% 10 <> 0
+        FROM generate_series(1, %s) AS n
+        """,
+        (concerts,),
+    )
+    cursor.execute("SELECT min(id) AS min_id, max(id) AS max_id FROM users")
+    user_ids = cursor.fetchone()
+    cursor.execute("SELECT min(id) AS min_id, max(id) AS max_id FROM concerts")
+    concert_ids = cursor.fetchone()
+    ids = {
+        "u0": user_ids["min_id"], "un": user_ids["max_id"] - user_ids["min_id"] + 1,
+        "c0": concert_ids["min_id"], "cn": concert_ids["max_id"] - concert_ids["min_id"] + 1,
+    }
+    cursor.execute(
+        """
+        INSERT INTO orders (user_id, concerts_id, quantity, status, created_at)
+        SELECT %(u0)s + n %% %(un)s, %(c0)s + n %% %(cn)s, 1 + n %% 3,
+               CASE WHEN n %% 5 = 0 THEN 'pending' ELSE 'paid' END,
+               CURRENT_TIMESTAMP - n * INTERVAL '1 minute'
+        FROM generate_series(1, %(rows)s) AS n
+        """,
+        {**ids, "rows": 500_000 * scale},
+    )
+    cursor.execute(
+        """
+        INSERT INTO cart (user_id, concerts_id, quantity)
+        SELECT DISTINCT ON (u, c) u, c, 1
+        FROM (
+            SELECT %(u0)s + n %% %(un)s AS u, %(c0)s + (n * 7) %% %(cn)s AS c
+            FROM generate_series(1, %(rows)s) AS n
+        ) AS s
+        """,
+        {**ids, "rows": 100_000 * scale},
+    )
+    cursor.execute(
+        """
+        INSERT INTO reviews (user_id, concerts_id, rating, review, created_at)
+        SELECT %(u0)s + n %% %(un)s, %(c0)s + n %% %(cn)s, 1 + n %% 5, 'review',
+               CURRENT_TIMESTAMP - n * INTERVAL '1 minute'
+        FROM generate_series(1, %(rows)s) AS n
+        """,
+        {**ids, "rows": 200_000 * scale},
+    )
+    cursor.execute(
+        """
+        INSERT INTO payments (order_id, payment_method, amount, status, created_at)
+        SELECT id, 'credit_card', 10, 'completed', created_at
+        FROM orders WHERE status = 'paid' LIMIT %s
+        """,
+        (200_000 * scale,),
+    )
+    cursor.execute(
+        """
+        INSERT INTO user_info (user_id, address, name, surname, created_at)
+        SELECT id, 'user@example.com', 'Name', 'Surname', CURRENT_TIMESTAMP - id * INTERVAL '1 second'
+        FROM users
+        """
+    )
+    # Временная таблица импорта концертов нужна для EXPLAIN запросов слияния
+    cursor.execute(CREATE_CONCERT_IMPORT_STAGING)
+    cursor.execute("ANALYZE")
+    return ids
+
+
+def sample_params(ids):
+    """Параметры для EXPLAIN каждого запроса каталога."""
+    user_id = ids["u0"] + 42
+    concert_id = ids["c0"] + 42
+    concert_name = "plan_concert_43"
+    first_page = {
+        "before_created_at": "infinity", "before_id": 2147483647,
+        "date_from": "-infinity", "date_to": "infinity", "limit": 11,
+    }
+    return {
+        "CREATE_USER": ("plan_new_user", "-", "user"),
+        "CREATE_CONCERT": ("plan_new_concert", "d", "a", 10, "2030-01-01 19:00:00"),
+        "GET_USER_BY_USERNAME": ("plan_user_42",),
+        "GET_CONCERTS": None,
+        "CREATE_ORDER": (user_id, concert_id, 1),
+        "GET_ORDERS": (user_id,),
+        "GET_CART_ITEMS": (user_id,),
+        "GET_CART_VERSION": (user_id,),
+        "ADD_TO_CART": {"user_id": user_id, "concert_id": concert_id, "quantity": 1},
+        "DELETE_FROM_CART": (user_id, concert_id),
+        "UPDATE_CART": {"user_id": user_id, "concert_ids": [concert_id, concert_id + 1], "quantities": [2, 0]},
+        "SEARCH_CONCERTS": {"query": "concert 42", "pattern": "%concert_42%", "limit": 20, "offset": 0},
+        "CHECKOUT_CART": {"user_id": user_id},
+        "SET_CONCERT_CAPACITY": (concert_id, 100, 8),
+        "REFRESH_CONCERT_AVAILABILITY": (concert_id,),
+        "GET_CONCERT_AVAILABILITY": (concert_id,),
+        "GET_AUDIT_SETTINGS": None,
+        "SET_AUDIT_MODE": ("orders", "statement"),
+        "GET_CONCERT_ID_BY_NAME": (concert_name,),
+        "CREATE_REVIEW": (user_id, concert_id, 5, "review"),
+        "GET_USER_INFO_FOR_UPDATE": (user_id,),
+        "UPDATE_USER_INFO": ("user@example.com", "Name", "Surname", user_id),
+        "CREATE_USER_INFO": (user_id, "user@example.com", "Name", "Surname"),
+        "GET_PAYMENTS": first_page,
+        "GET_ALL_REVIEWS": first_page,
+        "GET_ALL_ADDRESSES": first_page,
+        "GET_UNPAID_SUMMARY": (user_id,),
+        "GET_USER_ORDERS": (user_id,),
+        "GET_RECENT_USER_ORDERS": (user_id, 20),
+        "GET_UNPAID_TOTAL": (user_id,),
+        "PAY_ORDERS": (user_id,),
+        "CREATE_PAYMENT": (1, "credit_card", 10, "completed"),
+        "CHECK_UNPAID_SUMMARY": None,
+        "MERGE_CONCERT_IMPORT": {"overwrite": True},
+        "SET_IMPORTED_CAPACITY": {"concert_ids": [concert_id], "shards": 8},
+        "REBUILD_UNPAID_SUMMARY": None,
+        "GET_REVIEWS": None,
+        "EXPORT_ORDERS": None,
+        "EXPORT_PAYMENTS": None,
+        "EXPORT_REVIEWS": None,
+    }
+
+
+def seq_scans(plan):
+    if plan.get("Node Type") == "Seq Scan":
+        yield plan.get("Relation Name")
+    for child in plan.get("Plans", []):
+        yield from seq_scans(child)
+
+
+def check(cursor, ids):
+    params = sample_params(ids)
+    failures = []
+    for name, query in catalog():
+        if name not in params:
+            failures.append((name, "нет тестовых параметров, добавьте их в sample_params"))
+            continue
+        cursor.execute("SAVEPOINT plan_check")
+        try:
+            cursor.execute("EXPLAIN (FORMAT JSON) " + query, params[name])
+            plan = cursor.fetchone()["QUERY PLAN"]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+        except Exception as e:
+            cursor.execute("ROLLBACK TO SAVEPOINT plan_check")
+            failures.append((name, f"EXPLAIN не выполнен: {e}"))
+            continue
+        cursor.execute("RELEASE SAVEPOINT plan_check")
+        allowed = ALLOWED_SEQ_SCANS.get(name, set())
+        scanned = {table for table in seq_scans(plan[0]["Plan"]) if table in WATCHED_TABLES - allowed}
+        status = "OK" if not scanned else "SEQ SCAN: " + ", ".join(sorted(scanned))
+        print(f"{name:<32} {status}")
+        if scanned:
+            failures.append((name, status))
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scale", type=int, default=1)
+    args = parser.parse_args()
+
+    conn = get_connection()
+    try:
+        with conn.cursor() as cursor:
+            ids = seed(cursor, args.scale)
+            failures = check(cursor, ids)
+    finally:
+        conn.rollback()
+        conn.close()
+
+    if failures:
+        print("\nРегрессии планов:")
+        for name, reason in failures:
+            print(f"  {name}: {reason}")
+        sys.exit(1)
+    print("\nВсе планы используют индексы.")
+
+
+if __name__ == "__main__":
+    main()
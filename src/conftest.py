@@ -0,0 +1,7 @@
+import os
+
+# Тесты импортируют приложение так же, как uvicorn, запущенный из src/: app и backend.*.
+# Настройки из .env, без которых не импортируется backend.auth
+os.environ.setdefault("SECRET_KEY", "test-secret")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
@@ -0,0 +1,231 @@
+import os
+import tempfile
+import threading
+
+import requests
+import streamlit as st
+from cachetools import LRUCache
+from requests.adapters import HTTPAdapter
+
+API_URL = "http://127.0.0.1:8001"
+
+# Сколько секунд Streamlit хранит ответы на чтение: каталог меняется редко,
+# корзина и заказы пользователя сбрасываются явно после каждой записи
+CATALOG_TTL = 60
+USER_TTL = 30
+ADMIN_TTL = 15
+
+# Соединений с API в пуле сессии и тайм-ауты (подключение, чтение) в секундах.
+# Передача файлов (восстановление, импорт, скачивание копии) ждёт ответа без ограничения
+POOL_SIZE = 10
+REQUEST_TIMEOUT = (5, 60)
+TRANSFER_TIMEOUT = (5, None)
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+ETAG_CACHE_SIZE = 1024
+
+
+class ApiError(Exception):
+    def __init__(self, status_code, detail):
+        super().__init__(f"{status_code}: {detail}")
+        self.status_code = status_code
+        self.detail = detail
+
+
+@st.cache_resource
+def get_session():
+    """Одна сессия на процесс Streamlit: TCP-соединения с API остаются открытыми
+    (keep-alive) и переиспользуются всеми пользователями и перезапусками скрипта."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+@st.cache_resource
+def _etags():
+    # (путь, токен, параметры) -> (ETag, тело). Когда TTL истёк или кэш сброшен
+    # записью, ответ перепроверяется через If-None-Match и приходит как 304.
+    # Кэш общий для потоков всех сессий Streamlit, а LRUCache меняет порядок
+    # записей даже при чтении, поэтому любое обращение идёт под блокировкой
+    return LRUCache(maxsize=ETAG_CACHE_SIZE), threading.Lock()
+
+
+def _headers(token):
+    return {"Authorization": f"Bearer {token}"} if token else {}
+
+
+def error_detail(response):
+    try:
+        return response.json().get("detail", "Неизвестная ошибка")
+    except ValueError:
+        return response.text or "Неизвестная ошибка"
+
+
+def request(method, path, token=None, headers=None, **kwargs):
+    kwargs.setdefault("timeout", REQUEST_TIMEOUT)
+    return get_session().request(
+        method, f"{API_URL}{path}", headers={**_headers(token), **(headers or {})}, **kwargs
+    )
+
+
+def _get(path, token=None, params=None):
+    """GET с If-None-Match. Возвращает разобранный JSON или выбрасывает ApiError;
+    ошибки st.cache_data не кэширует, поэтому следующий вызов повторит запрос."""
+    etags, lock = _etags()
+    key = (path, token, tuple(sorted((params or {}).items())))
+    with lock:
+        cached = etags.get(key)
+    response = request("GET", path, token, params=params, headers={"If-None-Match": cached[0]} if cached else None)
+    if response.status_code == 304 and cached:
+        return cached[1]
+    if response.status_code != 200:
+        raise ApiError(response.status_code, error_detail(response))
+    data = response.json()
+    if response.headers.get("ETag"):
+        with lock:
+            etags[key] = (response.headers["ETag"], data)
+    return data
+
+
+# Чтение. Токен входит в ключ кэша, поэтому данные одного пользователя
+# не достаются другому
+
+@st.cache_data(ttl=CATALOG_TTL, show_spinner=False)
+def get_concerts():
+    return _get("/concerts")
+
+
+@st.cache_data(ttl=CATALOG_TTL, show_spinner=False)
+def search_concerts(query):
+    return _get("/concerts/search", params={"query": query})
+
+
+@st.cache_data(ttl=USER_TTL, show_spinner=False)
+def get_overview(token, fields):
+    """Корзина (cart), сводка неоплаченных заказов (summary) и последние заказы
+    (orders) текущего пользователя одним запросом; fields — разделы через запятую."""
+    return _get("/me/overview", token, params={"fields": fields})
+
+
+@st.cache_data(ttl=ADMIN_TTL, show_spinner=False)
+def get_admin_overview(params, token):
+    """Страницы отзывов, адресов и платежей одним запросом. params передаётся
+    кортежем пар, чтобы одинаковые фильтры и курсоры давали один ключ."""
+    return _get("/admin/overview", token, params=dict(params))
+
+
+def invalidate(*cached_calls):
+    for cached_call in cached_calls:
+        cached_call.clear()
+
+
+def invalidate_all():
+    invalidate(get_concerts, search_concerts, get_overview, get_admin_overview)
+    etags, lock = _etags()
+    with lock:
+        etags.clear()
+
+
+def _write(method, path, token=None, invalidates=(), **kwargs):
+    """Запрос на изменение. После успешного ответа сбрасывает кэш чтений,
+    которые он затрагивает; ответ возвращается вызывающему коду как есть."""
+    response = request(method, path, token, **kwargs)
+    if response.ok:
+        invalidate(*invalidates)
+    return response
+
+
+# Запись
+
+def register(payload):
+    return request("POST", "/register", json=payload)
+
+
+def login(username, password):
+    return request("POST", "/login", json={"username": username, "password": password})
+
+
+def save_address(token, payload):
+    return _write("POST", "/address/save", token, invalidates=(get_admin_overview,), json=payload)
+
+
+def send_review(token, payload):
+    return _write("POST", "/reviews/add", token, invalidates=(get_admin_overview,), json=payload)
+
+
+def add_to_cart(token, payload):
+    return _write("POST", "/cart/add", token, invalidates=(get_overview,), json=payload)
+
+
+def remove_from_cart(token, username, concert_id):
+    return _write(
+        "DELETE", "/cart/remove", token, invalidates=(get_overview,),
+        params={"username": username, "concert_id": concert_id}
+    )
+
+
+def update_cart(token, username, items):
+    return _write("PUT", "/cart", token, invalidates=(get_overview,), json={"username": username, "items": items})
+
+
+def checkout_cart(token, username):
+    # Оформление уменьшает число свободных билетов и может снять концерт с продажи
+    return _write(
+        "POST", f"/checkout/{username}", token,
+        invalidates=(get_overview, get_concerts, search_concerts)
+    )
+
+
+def pay_order(token, order_id, payload):
+    return _write(
+        "POST", f"/pay_order/{order_id}", token,
+        invalidates=(get_overview, get_admin_overview), json=payload
+    )
+
+
+def new_concert(payload):
+    return _write("POST", "/new_concert", invalidates=(get_concerts, search_concerts), json=payload)
+
+
+def import_concerts(token, file, file_format, overwrite):
+    return _write(
+        "POST", "/admin/concerts/import", token, invalidates=(get_concerts, search_concerts),
+        params={"format": file_format, "overwrite": overwrite}, files={"file": file}, timeout=TRANSFER_TIMEOUT
+    )
+
+
+def start_backup(token):
+    return request("POST", "/admin/backup", token)
+
+
+def start_restore(token, file):
+    return request("POST", "/admin/restore", token, files={"file": file}, timeout=TRANSFER_TIMEOUT)
+
+
+def get_job(token, kind, job_id):
+    """Состояние задачи резервного копирования или восстановления. Не кэшируется:
+    страница опрашивает его, пока задача не завершится."""
+    response = request("GET", f"/admin/{kind}/{job_id}", token)
+    if response.status_code != 200:
+        raise ApiError(response.status_code, error_detail(response))
+    job = response.json()
+    # Восстановленная база заменяет все данные, кэш чтений больше не действителен
+    if kind == "restore" and job.get("status") == "done" and not st.session_state.get(f"restore_invalidated_{job_id}"):
+        st.session_state[f"restore_invalidated_{job_id}"] = True
+        invalidate_all()
+    return job
+
+
+def download_backup(token, job_id):
+    """Скачивает архив резервной копии во временный файл порциями и возвращает
+    путь к нему. Ссылка в браузере не передала бы токен администратора."""
+    path = os.path.join(tempfile.gettempdir(), f"backup_{job_id}.tar")
+    with request("GET", f"/admin/backup/{job_id}/download", token, stream=True, timeout=TRANSFER_TIMEOUT) as response:
+        if response.status_code != 200:
+            raise ApiError(response.status_code, error_detail(response))
+        with open(path, "wb") as f:
+            for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+                f.write(chunk)
+    return path
@@ -1,72 +1,74 @@
 import streamlit as st
-import requests
+import os
 from datetime import datetime
 import pandas as pd
 from datetime import time
 
-API_URL = "http://127.0.0.1:8001"
+import api_client as api
+
+def current_token():
+    return st.session_state.get("token", "")
+
 def display_concerts():
     st.title("Доступные концерты")
     search_concerts()
     try:
-        response = requests.get(f"{API_URL}/concerts")
-        if response.status_code == 200:
-            concerts_items = response.json()
-            movie = ["ed_sheeran.jpg", "rammstein.jpg", "imagine_dragons.jpg", "21_pilots.jpg"]
-            k = 0
-            if concerts_items:
-                for item in concerts_items:
-                    # col1, col2 = st.columns([1, 2])
-                    # with col1:
-                    #     # Показываем изображение товара
-                    #     st.image(f"static/images/{movie[k]}", use_container_width=True)
-                    #     k = k + 1
+        concerts_items = api.get_concerts()
+        movie = ["ed_sheeran.jpg", "rammstein.jpg", "imagine_dragons.jpg", "21_pilots.jpg"]
+        k = 0
+        if concerts_items:
+            for item in concerts_items:
+                # col1, col2 = st.columns([1, 2])
+                # with col1:
+                #     # Показываем изображение товара
+                #     st.image(f"static/images/{movie[k]}", use_container_width=True)
+                #     k = k + 1
                     
-                    # with col2:
-                    st.subheader(item["name"])
-                    st.write(item["description"])
-                    st.write(item['address'])
-                    st.write(f"**Цена**: {item['price']} ₽")
-                    st.write(datetime.fromisoformat(item['date']).strftime('%Y-%m-%d %H:%M'))
-
-                    quantity = st.number_input(
-                        f"Количество для {item['name']}",
-                        min_value=1,
-                        max_value=10,
-                        value=1,
-                        key=f"quantity_{item['name']}"
-                    )
-
-                    if st.button(f"Добавить {item['name']} в корзину", key=f"add_{item['name']}"):
-                        add_to_cart(item["name"], quantity)
+                # with col2:
+                st.subheader(item["name"])
+                st.write(item["description"])
+                st.write(item['address'])
+                st.write(f"**Цена**: {item['price']} ₽")
+                st.write(datetime.fromisoformat(item['date']).strftime('%Y-%m-%d %H:%M'))
+
+                quantity = st.number_input(
+                    f"Количество для {item['name']}",
+                    min_value=1,
+                    max_value=10,
+                    value=1,
+                    key=f"quantity_{item['name']}"
+                )
+
+                if st.button(f"Добавить {item['name']} в корзину", key=f"add_{item['name']}"):
+                    add_to_cart(item["id"], item["name"], quantity)
                     
-                    st.write("Оставьте отзыв:")
+                st.write("Оставьте отзыв:")
                     
-                    col_pos, col_neg = st.columns(2)
-
-                    with col_pos:
-                        if st.button(f"👍 Отлично", key=f"positive_review_{item['name']}"):
-                            send_review(
-                                username=st.session_state.get("username"),
-                                item_name=item["name"],
-                                rating=5,
-                                review="Отлично!"
-                            )
-                            st.success("Положительный отзыв отправлен!")
-
-                    with col_neg:
-                        if st.button(f"👎 Плохо", key=f"negative_review_{item['name']}"):
-                            send_review(
-                                username=st.session_state.get("username"),
-                                item_name=item["name"],
-                                rating=1,
-                                review="Плохо!"
-                            )
-                            st.success("Отрицательный отзыв отправлен!")
-            else:
-                st.info("Предстоящих концертов нет.")
+                col_pos, col_neg = st.columns(2)
+
+                with col_pos:
+                    if st.button(f"👍 Отлично", key=f"positive_review_{item['name']}"):
+                        send_review(
+                            username=st.session_state.get("username"),
+                            item_name=item["name"],
+                            rating=5,
+                            review="Отлично!"
+                        )
+                        st.success("Положительный отзыв отправлен!")
+
+                with col_neg:
+                    if st.button(f"👎 Плохо", key=f"negative_review_{item['name']}"):
+                        send_review(
+                            username=st.session_state.get("username"),
+                            item_name=item["name"],
+                            rating=1,
+                            review="Плохо!"
+                        )
+                        st.success("Отрицательный отзыв отправлен!")
         else:
-            st.error(f"Ошибка загрузки списка концертов: {response.status_code}")
+            st.info("Предстоящих концертов нет.")
+    except api.ApiError as e:
+        st.error(f"Ошибка загрузки списка концертов: {e.status_code}")
     except Exception as e:
         st.error(f"Ошибка: {e}")
 
@@ -87,7 +89,7 @@ def update_address():
                         "surname": surname
                     }
                     try:
-                        response = requests.post(f"{API_URL}/address/save", json=payload)
+                        response = api.save_address(current_token(), payload)
                         if response.status_code == 200:
                             st.success("Адрес успешно сохранён!")
                         else:
@@ -103,22 +105,20 @@ def search_concerts():
     query = st.text_input("Введите строку для поиска")
     if st.button("Поиск"):
         try:
-            response = requests.get(f"{API_URL}/concerts/search", params={"query": query})
-            if response.status_code == 200:
-                results = response.json()
-                if results:
-                    for concert in results:
-
-                        st.write(f"**{concert['name']}** - {concert['price']} руб.")
-                        st.write(f"_Описание_: {concert['description']}")
-                        st.write(f"_Адрес_: {concert['address']}")
-                        st.write(f"_Дата_: {datetime.fromisoformat(concert['date']).strftime('%Y-%m-%d %H:%M')}")
-                        st.write(f"_Доступно_: {'Да' if concert['available'] else 'Нет'}")
-                        st.write("---")
-                else:
-                    st.info("Концерт не найден.")
+            results = api.search_concerts(query)
+            if results:
+                for concert in results:
+
+                    st.write(f"**{concert['name']}** - {concert['price']} руб.")
+                    st.write(f"_Описание_: {concert['description']}")
+                    st.write(f"_Адрес_: {concert['address']}")
+                    st.write(f"_Дата_: {datetime.fromisoformat(concert['date']).strftime('%Y-%m-%d %H:%M')}")
+                    st.write(f"_Доступно_: {'Да' if concert['available'] else 'Нет'}")
+                    st.write("---")
             else:
-                st.error(f"Ошибка: {response.status_code}")
+                st.info("Концерт не найден.")
+        except api.ApiError as e:
+            st.error(f"Ошибка: {e.status_code}")
         except Exception as e:
             st.error(f"Ошибка соединения с сервером: {e}")
 
@@ -130,40 +130,32 @@ def send_review(username, item_name, rating, review):
         "review": review,
     }
     try:
-        response = requests.post(f"{API_URL}/reviews/add", json=payload)
+        response = api.send_review(current_token(), payload)
     except Exception as e:
         st.error(f"Ошибка при отправке отзыва: {str(e)}")
 
-def add_to_cart(item_name, quantity):
+def add_to_cart(concert_id, item_name, quantity):
     if "username" not in st.session_state:
         st.error("Пожалуйста, авторизуйтесь, чтобы добавить товары в корзину.")
         return
 
     payload = {
         "username": st.session_state["username"],
-        "item_name": item_name,
+        "concert_id": concert_id,
         "quantity": quantity
     }
 
-    response = requests.post(f"{API_URL}/cart/add", json=payload)
+    # Кэш корзины сбрасывается клиентом, страница корзины загрузит её заново
+    response = api.add_to_cart(current_token(), payload)
     if response.status_code == 200:
         st.success(f"{item_name} добавлен в корзину.")
-        username = st.session_state["username"]
-        updated_response = requests.get(f"{API_URL}/cart/{username}")
-        if updated_response.status_code == 200:
-            st.session_state["cart_items"] = updated_response.json()
-        else:
-            st.error("Ошибка синхронизации корзины.")
     else:
         error_detail = response.json().get("detail", "Неизвестная ошибка")
-        if "duplicate key value" in error_detail:
-            st.warning(f"{item_name} уже находится в корзине. Вы можете обновить количество в корзине.")
-        else:
-            st.error(f"Ошибка добавления в корзину: {error_detail}")
+        st.error(f"Ошибка добавления в корзину: {error_detail}")
 
-def remove_from_cart(username, item_name):
+def remove_from_cart(username, concert_id, item_name):
     try:
-        response = requests.delete(f"{API_URL}/cart/remove", params={"username": username, "item_name": item_name})
+        response = api.remove_from_cart(current_token(), username, concert_id)
         if response.status_code == 200:
             st.success(f"{item_name} успешно удален из корзины.")
         else:
@@ -171,6 +163,19 @@ def remove_from_cart(username, item_name):
     except Exception as e:
         st.error(f"Ошибка при удалении: {str(e)}")
 
+def sync_cart(username, changes):
+    try:
+        response = api.update_cart(current_token(), username, changes)
+        if response.status_code == 200:
+            result = response.json()
+            if result["rejected"]:
+                st.warning("Для части концертов количество не изменено: билетов недостаточно или концерт недоступен.")
+            st.rerun()
+        else:
+            st.error(f"Ошибка обновления корзины: {response.json().get('detail', 'Неизвестная ошибка')}")
+    except Exception as e:
+        st.error(f"Ошибка обновления корзины: {str(e)}")
+
 def display_cart():
     st.title("🛒 Ваша корзина")
 
@@ -181,35 +186,39 @@ def display_cart():
     username = st.session_state["username"]
 
     try:
-        response = requests.get(f"{API_URL}/cart/{username}")
-        if response.status_code == 200:
-            cart_items = response.json()
-            st.session_state["cart_items"] = cart_items
-        else:
-            st.error(f"Ошибка загрузки корзины: {response.status_code}")
+        try:
+            cart_items = api.get_overview(current_token(), "cart")["cart"]
+        except api.ApiError as e:
+            st.error(f"Ошибка загрузки корзины: {e.status_code}")
             return
 
-        cart_items = st.session_state.get("cart_items", [])
         if cart_items:
             total_price = 0
+            changes = []
             for index, item in enumerate(cart_items):
                 st.subheader(item["item_name"])
-                st.write(f"Количество: {item['quantity']}")
+                quantity = st.number_input(
+                    "Количество",
+                    min_value=0,
+                    max_value=10,
+                    value=item["quantity"],
+                    key=f"cart_quantity_{item['concert_id']}"
+                )
+                if quantity != item["quantity"]:
+                    changes.append({"concert_id": item["concert_id"], "quantity": quantity})
                 st.write(f"Цена за единицу: {item['price']} ₽")
                 st.write(f"Добавлено: {item['created_at']}")
 
                 if st.button(f"Удалить {item['item_name']}", key=f"remove_{item['item_name']}_{index}"):
-                    remove_from_cart(username, item["item_name"])
-
-                    updated_response = requests.get(f"{API_URL}/cart/{username}")
-                    if updated_response.status_code == 200:
-                        st.session_state["cart_items"] = updated_response.json()
-                    else:
-                        st.error("Ошибка синхронизации корзины")
+                    remove_from_cart(username, item["concert_id"], item["item_name"])
                     st.rerun()
 
                 total_price += item["price"] * item["quantity"]
 
+            # Все изменения количества отправляются одним запросом
+            if changes and st.button("Сохранить изменения"):
+                sync_cart(username, changes)
+
             st.subheader(f"Итоговая сумма: {total_price:.2f} ₽")
 
         else:
@@ -230,7 +239,7 @@ def register():
             return
         
         payload = {"username": username, "password": password, "role": role}
-        response = requests.post(f"{API_URL}/register", json=payload)
+        response = api.register(payload)
         if response.status_code == 200:
             st.success("Регистрация прошла успешно! Вы можете войти.")
         else:
@@ -260,7 +269,7 @@ def new_concert():
             }
 
             try:
-                response = requests.post(f"{API_URL}/new_concert", json=payload)
+                response = api.new_concert(payload)
                 
                 if response.status_code == 200:
                     st.success("Концерт успешно добавлен!")
@@ -276,7 +285,7 @@ def login():
     username = st.text_input("Логин")
     password = st.text_input("Пароль", type="password")
     if st.button("Войти"):
-        response = requests.post(f"{API_URL}/login", json={"username": username, "password": password})
+        response = api.login(username, password)
         if response.status_code == 200:
             st.success("Успешная авторизация!")
             data = response.json()
@@ -321,18 +330,11 @@ def display_orders():
 
     # Делаем запрос к API для получения заказов пользователя
     try:
-        response = requests.get(f"{API_URL}/orders1/{username}")
-        response.raise_for_status()  # Проверяем статус ответа
-    except requests.exceptions.RequestException as e:
+        orders = api.get_overview(current_token(), "orders")["orders"]
+    except Exception as e:
         st.error(f"Не удалось загрузить заказы: {e}")
         return
 
-    # Парсим ответ API
-    orders = response.json()
-    if "message" in orders:
-        st.info(orders["message"])
-        return
-
     # Формируем данные для отображения
     orders_data = []
     for order in orders:
@@ -380,81 +382,155 @@ def display_addresses(addresses):
     df_addresses.index = df_addresses.index + 1
     st.dataframe(df_addresses)
 
-import requests
+def admin_page_filters():
+    col_size, col_from, col_to = st.columns(3)
+    with col_size:
+        page_size = st.selectbox("Записей на странице", [10, 25, 50, 100], key="admin_page_size")
+    with col_from:
+        date_from = st.date_input("С даты", value=None, key="admin_date_from")
+    with col_to:
+        date_to = st.date_input("По дату", value=None, key="admin_date_to")
+
+    params = {"limit": page_size}
+    if date_from:
+        params["date_from"] = datetime.combine(date_from, time(0, 0)).isoformat()
+    if date_to:
+        params["date_to"] = (datetime.combine(date_to, time(0, 0)) + pd.Timedelta(days=1)).isoformat()
+    return params
+
+def admin_section_cursors(endpoint, filters):
+    state_key = f"admin_cursors_{endpoint}"
+    filters_key = f"admin_filters_{endpoint}"
+    # При смене фильтров листаем с начала
+    if st.session_state.get(filters_key) != filters:
+        st.session_state[filters_key] = filters
+        st.session_state[state_key] = [None]
+    return st.session_state.setdefault(state_key, [None])
+
+def display_admin_section(title, endpoint, display_fn, page):
+    """Показывает одну страницу раздела и кнопки перехода по курсорам."""
+    st.header(title)
+    cursors = st.session_state[f"admin_cursors_{endpoint}"]
+
+    if page["items"]:
+        display_fn(page["items"])
+    else:
+        st.info("Записей нет.")
+
+    st.caption(f"Страница {len(cursors)}")
+    col_prev, col_next = st.columns(2)
+    with col_prev:
+        if len(cursors) > 1 and st.button("← Назад", key=f"prev_{endpoint}"):
+            cursors.pop()
+            st.rerun()
+    with col_next:
+        if page["next_cursor"] and st.button("Далее →", key=f"next_{endpoint}"):
+            cursors.append(page["next_cursor"])
+            st.rerun()
 
 def display_admin_page():
     st.title("Админ. страница")
-    headers = {"Authorization": f"Bearer {st.session_state['token']}"}
-
-    st.header("Просмотр отзывов")
-    try:
-        response = requests.get(f"{API_URL}/admin/reviews", headers=headers)
-        if response.status_code == 200:
-            reviews = response.json()
-            display_reviews(reviews)
-        else:
-            st.error(f"Ошибка загрузки отзывов: {response.json().get('detail', 'Неизвестная ошибка')}")
-    except Exception as e:
-        st.error(f"Ошибка загрузки отзывов: {str(e)}")
-
-    st.header("Просмотр информации пользователей")
-    try:
-        response = requests.get(f"{API_URL}/admin/addresses", headers=headers)
-        if response.status_code == 200:
-            addresses = response.json()
-            display_addresses(addresses)
-        else:
-            st.error(f"Ошибка загрузки информации: {response.json().get('detail', 'Неизвестная ошибка')}")
-    except Exception as e:
-        st.error(f"Ошибка загрузки информации: {str(e)}")
-
-    st.header("Просмотр платежей")
+    token = current_token()
+
+    filters = admin_page_filters()
+    # Все три раздела приходят одним ответом /admin/overview
+    params = dict(filters)
+    for endpoint in ("reviews", "addresses", "payments"):
+        cursors = admin_section_cursors(endpoint, filters)
+        if cursors[-1]:
+            params[f"{endpoint}_cursor"] = cursors[-1]
     try:
-        response = requests.get(f"{API_URL}/admin/payments", headers=headers)
-        if response.status_code == 200:
-            payments = response.json()
-            display_payments(payments)
-        else:
-            st.error(f"Ошибка загрузки платежей: {response.json().get('detail', 'Неизвестная ошибка')}")
+        overview = api.get_admin_overview(tuple(sorted(params.items())), token)
+        display_admin_section("Просмотр отзывов", "reviews", display_reviews, overview["reviews"])
+        display_admin_section("Просмотр информации пользователей", "addresses", display_addresses, overview["addresses"])
+        display_admin_section("Просмотр платежей", "payments", display_payments, overview["payments"])
+    except api.ApiError as e:
+        st.error(f"Ошибка загрузки данных администратора: {e.detail}")
     except Exception as e:
-        st.error(f"Ошибка загрузки платежей: {str(e)}")
+        st.error(f"Ошибка загрузки данных администратора: {str(e)}")
     
     st.header("Управление резервными копиями")
     
     if st.button("Создать резервную копию"):
         try:
-            response = requests.post(f"{API_URL}/admin/backup", headers=headers)
-            if response.status_code == 200:
-                st.success("Резервная копия успешно создана!")
-                st.download_button(
-                    label="Скачать резервную копию",
-                    data=response.content,
-                    file_name="db_backup.sql",
-                    mime="application/sql"
-                )
+            response = api.start_backup(token)
+            if response.status_code == 202:
+                st.session_state["backup_job"] = response.json()["id"]
+                st.success("Резервное копирование запущено")
             else:
                 st.error(f"Ошибка создания резервной копии: {response.json().get('detail', 'Неизвестная ошибка')}")
         except Exception as e:
             st.error(f"Ошибка создания резервной копии: {str(e)}")
 
-    uploaded_file = st.file_uploader("Загрузить резервную копию для восстановления", type=["sql"])
+    backup_job = st.session_state.get("backup_job")
+    if backup_job:
+        try:
+            job = api.get_job(token, "backup", backup_job)
+            if job.get("status") == "done":
+                st.success("Резервная копия готова")
+                if st.button("Скачать резервную копию"):
+                    st.session_state[f"backup_file_{backup_job}"] = api.download_backup(token, backup_job)
+                backup_file = st.session_state.get(f"backup_file_{backup_job}")
+                if backup_file and os.path.exists(backup_file):
+                    with open(backup_file, "rb") as f:
+                        st.download_button("Сохранить файл", f, file_name=os.path.basename(backup_file), mime="application/x-tar")
+            elif job.get("status") == "failed":
+                st.error(f"Ошибка создания резервной копии: {job.get('message')}")
+            else:
+                st.info(f"Резервное копирование выполняется: {job.get('message') or job.get('status')}")
+                st.button("Обновить статус")
+        except Exception as e:
+            st.error(f"Ошибка получения статуса резервной копии: {str(e)}")
+
+    uploaded_file = st.file_uploader("Загрузить резервную копию для восстановления", type=["sql", "dump", "tar"])
     if uploaded_file is not None and st.button("Восстановить из резервной копии"):
         try:
-            files = {"file": uploaded_file}
-            response = requests.post(f"{API_URL}/admin/restore", files=files, headers=headers)
-            if response.status_code == 200:
-                st.success("Данные успешно восстановлены из резервной копии!")
+            response = api.start_restore(token, uploaded_file)
+            if response.status_code == 202:
+                st.session_state["restore_job"] = response.json()["id"]
+                st.success("Восстановление запущено")
             else:
                 st.error(f"Ошибка восстановления: {response.json().get('detail', 'Неизвестная ошибка')}")
         except Exception as e:
             st.error(f"Ошибка восстановления: {str(e)}")
+
+    restore_job = st.session_state.get("restore_job")
+    if restore_job:
+        try:
+            job = api.get_job(token, "restore", restore_job)
+            if job.get("status") == "done":
+                st.success("Данные успешно восстановлены из резервной копии!")
+            elif job.get("status") == "failed":
+                st.error(f"Ошибка восстановления: {job.get('message')}")
+            else:
+                st.info(f"Восстановление выполняется ({job.get('progress', 0)} объектов): {job.get('message') or job.get('status')}")
+                st.button("Обновить статус восстановления")
+        except Exception as e:
+            st.error(f"Ошибка получения статуса восстановления: {str(e)}")
     
+    st.header("Импорт концертов")
+    import_file = st.file_uploader("Файл с концертами (CSV или NDJSON)", type=["csv", "ndjson", "jsonl"])
+    overwrite = st.checkbox("Обновлять существующие концерты", value=True)
+    if import_file is not None and st.button("Импортировать концерты"):
+        try:
+            file_format = "csv" if import_file.name.endswith(".csv") else "ndjson"
+            response = api.import_concerts(token, import_file, file_format, overwrite)
+            if response.status_code == 200:
+                report = response.json()
+                st.success(f"Добавлено: {report['inserted']}, обновлено: {report['updated']}, ошибок: {report['error_count']}")
+                if report["errors"]:
+                    st.dataframe(report["errors"])
+            else:
+                st.error(f"Ошибка импорта: {response.json().get('detail', 'Неизвестная ошибка')}")
+        except Exception as e:
+            st.error(f"Ошибка импорта: {str(e)}")
+
     new_concert()
 
 
 def checkout_cart(username):
     try:
-        response = requests.post(f"{API_URL}/checkout/{username}")
+        response = api.checkout_cart(current_token(), username)
         if response.status_code == 200:
             result = response.json()
             st.success(result["message"])
@@ -465,12 +541,10 @@ def checkout_cart(username):
         st.error(f"Ошибка при оформлении заказа: {str(e)}")
 def load_cart(username):
     try:
-        response = requests.get(f"{API_URL}/cart/{username}")
-        if response.status_code == 200:
-            return response.json()
-        else:
-            st.error("Ошибка при загрузке корзины")
-            return []
+        return api.get_overview(current_token(), "cart")["cart"]
+    except api.ApiError:
+        st.error("Ошибка при загрузке корзины")
+        return []
     except Exception as e:
         st.error(f"Ошибка: {str(e)}")
         return []
@@ -496,7 +570,7 @@ def pay_order(order_id, payment_method, amount):
             "payment_method": payment_method,
             "amount": amount
         }
-        response = requests.post(f"{API_URL}/pay_order/{order_id}", json=payload)
+        response = api.pay_order(current_token(), order_id, payload)
         if response.status_code == 200:
             result = response.json()
             st.success(result["message"])
@@ -510,12 +584,10 @@ def pay_order(order_id, payment_method, amount):
 
 def load_orders(username):
     try:
-        response = requests.get(f"{API_URL}/orders/{username}")
-        if response.status_code == 200:
-            return response.json()
-        else:
-            st.error("Ошибка при загрузке заказов")
-            return {}
+        return api.get_overview(current_token(), "summary")["summary"] or {}
+    except api.ApiError:
+        st.error("Ошибка при загрузке заказов")
+        return {}
     except Exception as e:
         st.error(f"Ошибка: {str(e)}")
         return {}
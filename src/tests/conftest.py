@@ -0,0 +1,61 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app import app
+from backend.auth import get_current_user
+from backend.database import get_db
+
+USER = {"id": 7, "username": "alice", "role": "user"}
+
+
+class FakeCursor:
+    """Курсор, отвечающий заранее заданными строками на каждый запрос."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.rows = []
+
+    def execute(self, query, params=None):
+        self.conn.executed.append((query, params))
+        self.rows = list(self.conn.results.get(query, []))
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def fetchall(self):
+        return self.rows
+
+
+class FakeConnection:
+    def __init__(self, results=None):
+        self.results = results or {}
+        self.executed = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+@pytest.fixture
+def user():
+    return USER
+
+
+@pytest.fixture
+def conn():
+    conn = FakeConnection()
+    app.dependency_overrides[get_db] = lambda: conn
+    app.dependency_overrides[get_current_user] = lambda: USER
+    yield conn
+    app.dependency_overrides.clear()
+
+
+@pytest.fixture
+def client(conn):
+    # Без with: lifespan с пулами и слушателем уведомлений не запускается
+    return TestClient(app)
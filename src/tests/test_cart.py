@@ -0,0 +1,58 @@
+from datetime import datetime
+
+from backend.queries import ADD_TO_CART, GET_CART_VERSION, GET_CART_ITEMS
+
+CART_ROW = {
+    "concert_id": 3,
+    "item_name": "Концерт",
+    "quantity": 2,
+    "price": 1500,
+    "created_at": datetime(2024, 12, 1, 19, 30),
+}
+
+
+def test_get_cart_returns_etag(client, conn):
+    conn.results = {GET_CART_VERSION: [{"version": 4}], GET_CART_ITEMS: [CART_ROW]}
+    response = client.get("/cart/alice")
+    assert response.status_code == 200
+    assert response.headers["ETag"]
+    assert response.headers["Cache-Control"] == "private, no-cache"
+    assert response.json() == [{
+        "concert_id": 3, "item_name": "Концерт", "quantity": 2, "price": 1500.0, "created_at": "01.12.2024 19:30:00",
+    }]
+
+
+def test_get_cart_not_modified(client, conn):
+    conn.results = {GET_CART_VERSION: [{"version": 4}], GET_CART_ITEMS: [CART_ROW]}
+    etag = client.get("/cart/alice").headers["ETag"]
+    conn.executed.clear()
+
+    response = client.get("/cart/alice", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    # Содержимое корзины при совпавшем ETag не читается
+    assert [query for query, _ in conn.executed] == [GET_CART_VERSION]
+
+
+def test_get_cart_etag_changes_with_version(client, conn):
+    conn.results = {GET_CART_VERSION: [{"version": 4}], GET_CART_ITEMS: [CART_ROW]}
+    etag = client.get("/cart/alice").headers["ETag"]
+
+    conn.results[GET_CART_VERSION] = [{"version": 5}]
+    response = client.get("/cart/alice", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+def test_add_to_cart_rejects_non_positive_quantity(client, conn):
+    for quantity in (0, -1):
+        response = client.post("/cart/add", json={"concert_id": 3, "quantity": quantity})
+        assert response.status_code == 422
+    assert conn.executed == []
+
+
+def test_add_to_cart(client, conn, user):
+    conn.results = {ADD_TO_CART: [{"id": 1}]}
+    response = client.post("/cart/add", json={"concert_id": 3, "quantity": 2})
+    assert response.status_code == 200
+    assert conn.executed == [(ADD_TO_CART, {"user_id": user["id"], "concert_id": 3, "quantity": 2})]